@@ -0,0 +1,31 @@
+"""Add user.is_active
+
+Revision ID: 103d86de421b
+Revises: f95963ec37e8
+Create Date: 2026-10-17 10:04:27.905311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '103d86de421b'
+down_revision: Union[str, None] = 'f95963ec37e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'user',
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.true())
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user', 'is_active')
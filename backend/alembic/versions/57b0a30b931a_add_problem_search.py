@@ -0,0 +1,55 @@
+"""Add full-text and trigram search on problems
+
+Revision ID: 57b0a30b931a
+Revises: 103d86de421b
+Create Date: 2026-10-17 11:42:10.331870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '57b0a30b931a'
+down_revision: Union[str, None] = '103d86de421b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column(
+        'problem',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('english', name), 'A') || "
+                "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+                persisted=True
+            ),
+            nullable=True
+        )
+    )
+    op.create_index(
+        'ix_problem_search_vector', 'problem', ['search_vector'], unique=False, postgresql_using='gin'
+    )
+    op.create_index(
+        'ix_problem_name_trgm',
+        'problem',
+        ['name'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_problem_name_trgm', table_name='problem', postgresql_using='gin')
+    op.drop_index('ix_problem_search_vector', table_name='problem', postgresql_using='gin')
+    op.drop_column('problem', 'search_vector')
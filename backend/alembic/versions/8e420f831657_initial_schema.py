@@ -0,0 +1,57 @@
+"""Initial schema
+
+Revision ID: 8e420f831657
+Revises: 
+Create Date: 2026-10-17 09:12:44.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e420f831657'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user',
+        sa.Column('email', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('is_superuser', sa.Boolean(), nullable=False),
+        sa.Column('first_name', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True),
+        sa.Column('last_name', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True),
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('hashed_password', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_email'), 'user', ['email'], unique=True)
+    op.create_table(
+        'problem',
+        sa.Column('number', sa.Integer(), nullable=False),
+        sa.Column('name', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('description', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True),
+        sa.Column('difficulty', sa.Enum('EASY', 'MEDIUM', 'HARD', name='difficulty'), nullable=False),
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_problem_number'), 'problem', ['number'], unique=True)
+    op.create_index(op.f('ix_problem_name'), 'problem', ['name'], unique=False)
+    op.create_index(op.f('ix_problem_difficulty'), 'problem', ['difficulty'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_problem_difficulty'), table_name='problem')
+    op.drop_index(op.f('ix_problem_name'), table_name='problem')
+    op.drop_index(op.f('ix_problem_number'), table_name='problem')
+    op.drop_table('problem')
+    sa.Enum(name='difficulty').drop(op.get_bind(), checkfirst=True)
+    op.drop_index(op.f('ix_user_email'), table_name='user')
+    op.drop_table('user')
@@ -0,0 +1,34 @@
+"""Add catalog version
+
+Revision ID: bdd431e44fbd
+Revises: fd024a57c843
+Create Date: 2026-10-17 15:12:04.518236
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bdd431e44fbd'
+down_revision: Union[str, None] = 'fd024a57c843'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    catalogversion = op.create_table(
+        'catalogversion',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(catalogversion, [{'id': 1, 'version': 1}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('catalogversion')
@@ -0,0 +1,36 @@
+"""Add problem content
+
+Revision ID: c41e9a7d2f60
+Revises: bdd431e44fbd
+Create Date: 2026-10-17 22:41:37.204815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e9a7d2f60'
+down_revision: Union[str, None] = 'bdd431e44fbd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'problemcontent',
+        sa.Column('statement', sa.Text(), nullable=True),
+        sa.Column('examples', sa.Text(), nullable=True),
+        sa.Column('constraints', sa.Text(), nullable=True),
+        sa.Column('problem_id', sa.Uuid(), nullable=False),
+        sa.ForeignKeyConstraint(['problem_id'], ['problem.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('problem_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('problemcontent')
@@ -0,0 +1,46 @@
+"""Add email outbox
+
+Revision ID: f830115fab95
+Revises: 57b0a30b931a
+Create Date: 2026-10-17 12:58:36.270145
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f830115fab95'
+down_revision: Union[str, None] = '57b0a30b931a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'emailoutbox',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('email_to', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('subject', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('html_content', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('failed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        op.f('ix_emailoutbox_next_attempt_at'), 'emailoutbox', ['next_attempt_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_emailoutbox_next_attempt_at'), table_name='emailoutbox')
+    op.drop_table('emailoutbox')
@@ -0,0 +1,34 @@
+"""Add composite indexes for problem list pagination
+
+Revision ID: f95963ec37e8
+Revises: 8e420f831657
+Create Date: 2026-10-17 09:31:05.642917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f95963ec37e8'
+down_revision: Union[str, None] = '8e420f831657'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_problem_name_number', 'problem', ['name', 'number'], unique=False)
+    op.create_index('ix_problem_difficulty_number', 'problem', ['difficulty', 'number'], unique=False)
+    op.create_index(
+        'ix_problem_difficulty_name_number', 'problem', ['difficulty', 'name', 'number'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_problem_difficulty_name_number', table_name='problem')
+    op.drop_index('ix_problem_difficulty_number', table_name='problem')
+    op.drop_index('ix_problem_name_number', table_name='problem')
@@ -0,0 +1,60 @@
+"""Add problem solve log and per-user stats
+
+Revision ID: fd024a57c843
+Revises: f830115fab95
+Create Date: 2026-10-17 14:20:51.774093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fd024a57c843'
+down_revision: Union[str, None] = 'f830115fab95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'problemsolved',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('problem_id', sa.Uuid(), nullable=False),
+        sa.Column('solved_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['problem_id'], ['problem.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'problem_id', name='uq_problemsolved_user_id_problem_id')
+    )
+    op.create_index(
+        op.f('ix_problemsolved_problem_id'), 'problemsolved', ['problem_id'], unique=False
+    )
+    op.create_index(
+        'ix_problemsolved_user_id_solved_at_id',
+        'problemsolved',
+        ['user_id', 'solved_at', 'id'],
+        unique=False
+    )
+    op.create_table(
+        'userstats',
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('easy_solved', sa.Integer(), nullable=False),
+        sa.Column('medium_solved', sa.Integer(), nullable=False),
+        sa.Column('hard_solved', sa.Integer(), nullable=False),
+        sa.Column('total_solved', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('userstats')
+    op.drop_index('ix_problemsolved_user_id_solved_at_id', table_name='problemsolved')
+    op.drop_index(op.f('ix_problemsolved_problem_id'), table_name='problemsolved')
+    op.drop_table('problemsolved')
@@ -0,0 +1,129 @@
+import gzip
+import hashlib
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+
+import brotli
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import catalog_cache
+from app.core.config import settings
+
+# Smaller bodies do not shrink enough to be worth compressing
+COMPRESS_MIN_BYTES = 500
+
+_COMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+    "br": lambda content: brotli.compress(content, quality=5),
+    "gzip": lambda content: gzip.compress(content, compresslevel=6, mtime=0)
+}
+
+
+@dataclass
+class CachedBody:
+    tag: str
+    content: bytes
+    # Compressed variants, filled in the first time each is requested
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+
+def choose_encoding(
+        accept_encoding: str, codings: Iterable[str] = tuple(_COMPRESSORS)
+) -> str | None:
+    """Pick the first of `codings` an `Accept-Encoding` header allows."""
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        name, _, value = params.partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+    for coding in codings:
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def etag_matches(if_none_match: str | None, tag: str) -> bool:
+    """
+    Weak comparison as RFC 9110 requires for `If-None-Match`, ignoring the
+    content coding suffix so any encoding of the same body matches. `*`
+    matches too, callers must make sure the resource exists.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip().removeprefix("W/").strip('"')
+        if candidate == "*":
+            return True
+        for coding in _COMPRESSORS:
+            candidate = candidate.removesuffix(f"-{coding}")
+        if candidate == tag:
+            return True
+    return False
+
+
+def _is_wildcard(if_none_match: str) -> bool:
+    return any(candidate.strip() == "*" for candidate in if_none_match.split(","))
+
+
+async def catalog_response(
+        request: Request,
+        *,
+        version: int,
+        key: str,
+        build: Callable[[], Awaitable[bytes]]
+) -> Response:
+    """
+    Serve a catalog read with a strong ETag derived from the catalog version.
+
+    A matching `If-None-Match` gets a 304 without touching the data: a tag
+    made for this version and `key` was only ever sent with a body, so the
+    resource still exists. `If-None-Match: *` does not prove that, so the body
+    is resolved first and `build` can still answer 404. Otherwise the JSON
+    body returned by `build`, and each compressed variant of it, is built
+    once per catalog version and `key`, so repeated reads skip both the query
+    and serialization.
+
+    The ETag names the content coding negotiated from `Accept-Encoding`, even
+    when a small body is sent uncompressed, so a 304 carries the same tag as
+    the 200 it stands for without needing the body.
+    """
+    tag = f"{version}-{hashlib.blake2b(key.encode(), digest_size=8).hexdigest()}"
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    headers = {
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding",
+        "ETag": f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+    }
+    if_none_match = request.headers.get("if-none-match")
+    cached: CachedBody | None = catalog_cache.get((version, key))
+    if etag_matches(if_none_match, tag):
+        if cached is None and _is_wildcard(if_none_match or ""):
+            cached = await _build(version, key, tag, build)
+        return Response(status_code=304, headers=headers)
+
+    if cached is None:
+        cached = await _build(version, key, tag, build)
+    content = cached.content
+    if encoding is not None and len(content) >= COMPRESS_MIN_BYTES:
+        if encoding not in cached.encoded:
+            cached.encoded[encoding] = await run_in_threadpool(
+                _COMPRESSORS[encoding], cached.content
+            )
+        content = cached.encoded[encoding]
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+async def _build(
+        version: int, key: str, tag: str, build: Callable[[], Awaitable[bytes]]
+) -> CachedBody:
+    cached = CachedBody(tag=tag, content=await build())
+    if len(cached.content) <= settings.CATALOG_CACHE_MAX_BODY_BYTES:
+        catalog_cache.set((version, key), cached)
+    return cached
@@ -1,18 +1,25 @@
-from collections.abc import Generator
-from typing import Annotated
+import logging
+import uuid
+from collections.abc import AsyncGenerator, Generator
+from typing import Annotated, Any
 
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
+from sqlalchemy.orm import make_transient_to_detached
 from sqlmodel import Session
 
 from app.core import security
+from app.core.cache import user_cache
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import AsyncDB, engine, open_async_db
+from app.core.metrics import QueryBudgetExceeded, current_query_stats
 from app.models import TokenPayload, User
 
+logger = logging.getLogger(__name__)
+
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
@@ -23,11 +30,34 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncDB, None]:
+    async with open_async_db() as db:
+        yield db
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncDB, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def _get_user(*, session: Session, user_id: str | None) -> User | None:
+    try:
+        key = uuid.UUID(user_id)
+    except (TypeError, ValueError):
+        return None
+    cached = user_cache.get(key)
+    if cached is not None:
+        # Attach a session-local copy without emitting a SELECT
+        return session.merge(cached, load=False)
+    user = session.get(User, key)
+    if user:
+        detached = User.model_validate(user)
+        make_transient_to_detached(detached)
+        user_cache.set(key, detached)
+    return user
+
+
+async def get_current_user(db: AsyncSessionDep, token: TokenDep) -> User:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
@@ -38,7 +68,8 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials"
         )
-    user = session.get(User, token_data.sub)
+    db.sticky_key = token_data.sub
+    user = await db.read(_get_user, user_id=token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -55,4 +86,28 @@ def get_current_active_superuser(current_user: CurrentUser) -> User:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="The user doesn't have enough privileges"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+def query_budget(limit: int) -> Any:
+    """
+    Route dependency declaring how many queries a request may issue, e.g.
+    `@router.get("/", dependencies=[query_budget(3)])`.
+
+    Every query of the request counts, including those of other
+    dependencies such as `get_current_user`. Going over the budget logs an
+    error, or raises `QueryBudgetExceeded` with `DB_QUERY_BUDGET_RAISE`, so
+    an N+1 pattern fails tests instead of slowly reaching production.
+    """
+
+    async def check_query_budget() -> AsyncGenerator[None, None]:
+        yield
+        stats = current_query_stats()
+        if stats is None or stats.queries <= limit:
+            return
+        message = f"{stats.route} issued {stats.queries} queries, its budget is {limit}"
+        if settings.DB_QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.error(message)
+
+    return Depends(check_query_budget)
@@ -0,0 +1,48 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from typing import Any
+
+from fastapi import HTTPException
+
+
+def encode_cursor(key: str, values: list[Any]) -> str:
+    """
+    Build an opaque keyset cursor from the sort values of the last row.
+
+    `key` names the ordering the values belong to, so a cursor cannot be
+    replayed against a different endpoint or sort.
+    """
+    payload = json.dumps({"q": key, "k": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _is_instance(value: Any, type_: type) -> bool:
+    # JSON true and false decode to bool, which would pass as int
+    return isinstance(value, type_) and not (isinstance(value, bool) and type_ is not bool)
+
+
+def decode_cursor(cursor: str, key: str, types: Sequence[type]) -> list[Any]:
+    """
+    Decode a cursor made by `encode_cursor` for the ordering `key`.
+
+    The cursor comes from the client, so it must hold one value of the
+    matching type per entry of `types`; anything else is a 400 rather than a
+    query comparing a column to a value of the wrong type.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        values = payload["k"]
+        valid = (
+            payload["q"] == key
+            and isinstance(values, list)
+            and len(values) == len(types)
+            and all(map(_is_instance, values, types))
+        )
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -0,0 +1,21 @@
+from typing import Any
+
+from fastapi import APIRouter, Response, status
+
+from app.api.warmup import readiness
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/ready", include_in_schema=False)
+def get_readiness(response: Response) -> dict[str, Any]:
+    """
+    Readiness probe, 503 until this worker has finished warming up.
+
+    Point the load balancer here rather than at an API route, so a new
+    worker only gets traffic once its first requests are as fast as the rest.
+    The body reports warm-up attempts, the last error and step timings.
+    """
+    if not readiness.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return readiness.status()
@@ -6,40 +6,72 @@ from fastapi.security import OAuth2PasswordRequestForm
 from starlette.responses import HTMLResponse
 
 from app import crud
-from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
+from app.api.deps import (
+    AsyncSessionDep,
+    CurrentUser,
+    SessionDep,
+    get_current_active_superuser,
+    query_budget
+)
 from app.core import security
 from app.core.config import settings
-from app.core.security import get_password_hash
-from app.models import Message, NewPassword, Token, TokenPayload, UserPublic
+from app.core.mailer import mailer
+from app.core.security import PasswordHashPoolFull, password_hash_pool
+from app.models import Message, NewPassword, Token, TokenPayload, UserPublic, UserUpdate
 from app.utils import (
     generate_reset_password_email,
     generate_reset_password_token,
-    send_email,
     verify_reset_password_token,
 )
 
 router = APIRouter(tags=["login"])
 
 
-@router.post("/login/access-token")
-def login_access_token(
-        session: SessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+def _hash_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many concurrent password operations, try again shortly",
+        headers={"Retry-After": "1"}
+    )
+
+
+@router.post("/login/access-token", dependencies=[query_budget(2)])
+async def login_access_token(
+        db: AsyncSessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ) -> Token:
     """
     OAuth2-compatible login to obtain an access token for authenticated requests.
 
-    - **session**: Database session dependency.
+    - **db**: Async database session dependency.
     - **form_data**: Login form data with `username` and `password`.
 
-    Returns an access token if authentication is successful.
+    Returns an access token if authentication is successful. Password
+    verification runs on the dedicated hashing pool and returns 503 when it
+    is saturated. Hashes made with another bcrypt cost are rehashed.
     """
-    user = crud.authenticate(
-        session=session, email=form_data.username, password=form_data.password
-    )
+    user = await db.run(crud.get_user_by_email, email=form_data.username)
+    new_hash = None
+    try:
+        if user:
+            verified, new_hash = await password_hash_pool.verify_and_update(
+                form_data.password, user.hashed_password
+            )
+            if not verified:
+                user = None
+    except PasswordHashPoolFull:
+        raise _hash_pool_busy()
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    if new_hash:
+        # Stored hash used a different cost than BCRYPT_ROUNDS, migrate it
+        await db.run(
+            crud.update_user,
+            user_id=user.id,
+            user_update=UserUpdate(),
+            extra_data={"hashed_password": new_hash}
+        )
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return Token(
         access_token=security.create_access_token(
@@ -48,7 +80,7 @@ def login_access_token(
     )
 
 
-@router.post("/login/test-token", response_model=UserPublic)
+@router.post("/login/test-token", response_model=UserPublic, dependencies=[query_budget(1)])
 def test_token(current_user: CurrentUser) -> Any:
     """
     Test the validity of an access token by retrieving the current user.
@@ -60,17 +92,18 @@ def test_token(current_user: CurrentUser) -> Any:
     return current_user
 
 
-@router.post("/password-recovery/{email}")
-def recover_password(email: str, session: SessionDep) -> Message:
+@router.post("/password-recovery/{email}", dependencies=[query_budget(2)])
+async def recover_password(email: str, db: AsyncSessionDep) -> Message:
     """
     Send a password recovery email to the specified address.
 
     - **email**: Email of the user requesting password reset.
-    - **session**: Database session dependency.
+    - **db**: Async database session dependency.
 
-    Sends a recovery link if the user exists.
+    Queues a recovery link if the user exists; the email is delivered in the
+    background.
     """
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await db.run(crud.get_user_by_email, email=email)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -79,7 +112,7 @@ def recover_password(email: str, session: SessionDep) -> Message:
     email_data = generate_reset_password_email(
         email_to=user.email, email=email, token=password_reset_token
     )
-    send_email(
+    await mailer.enqueue(
         email_to=user.email,
         subject=email_data.subject,
         html_content=email_data.html_content
@@ -88,12 +121,12 @@ def recover_password(email: str, session: SessionDep) -> Message:
     return Message(message="Password recovery email sent")
 
 
-@router.post("reset-password/")
-def reset_password(session: SessionDep, body: NewPassword) -> Message:
+@router.post("reset-password/", dependencies=[query_budget(2)])
+async def reset_password(db: AsyncSessionDep, body: NewPassword) -> Message:
     """
     Reset the password using a valid token.
 
-    - **session**: Database session dependency.
+    - **db**: Async database session dependency.
     - **body**: Payload containing the new password and token.
 
     Updates the user's password if the token is valid.
@@ -102,25 +135,30 @@ def reset_password(session: SessionDep, body: NewPassword) -> Message:
 
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await db.run(crud.get_user_by_email, email=email)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
 
-    hashed_password = get_password_hash(password=body.new_password)
-    user.hashed_password = hashed_password
-
-    session.add(user)
-    session.commit()
+    try:
+        hashed_password = await password_hash_pool.hash(body.new_password)
+    except PasswordHashPoolFull:
+        raise _hash_pool_busy()
+    await db.run(
+        crud.update_user,
+        user_id=user.id,
+        user_update=UserUpdate(),
+        extra_data={"hashed_password": hashed_password}
+    )
     return Message(message="Password updated successfully")
 
 
 @router.post(
     "/password-recovery-html-content/{email}",
     dependencies=[Depends(get_current_active_superuser)],
-    response_model=HTMLResponse
+    response_class=HTMLResponse
 )
 def recover_password_html_content(email: str, session: SessionDep) -> Any:
     """
@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.cache import catalog_cache, user_cache
+from app.core.catalog import problem_catalog
+from app.core.db import get_pool_stats, replicas
+from app.core.mailer import mailer
+from app.core.metrics import render_stats, request_metrics
+from app.core.security import password_hash_pool
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics() -> str:
+    """
+    Expose request, query, pool, replica, cache and mailer metrics in the
+    Prometheus text format.
+
+    Values are per worker process; Prometheus tells workers apart by the
+    scrape target.
+    """
+    lines = request_metrics.render()
+    for name, stats in get_pool_stats().items():
+        lines += render_stats("db_pool", stats, engine=name)
+    for name, stats in replicas.stats().items():
+        lines += render_stats("db_replica", stats, replica=name)
+    lines += render_stats("password_hash_pool", password_hash_pool.stats())
+    lines += render_stats("cache", user_cache.stats(), cache="user")
+    lines += render_stats("cache", catalog_cache.stats(), cache="catalog")
+    lines += render_stats("problem_catalog", problem_catalog.stats())
+    lines += render_stats("mailer", mailer.stats())
+    return "\n".join(lines) + "\n"
@@ -1,96 +1,427 @@
 import uuid
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
-from app.api.deps import CurrentUser, SessionDep
+from app import crud
+from app.api.conditional import catalog_response
+from app.api.deps import AsyncSessionDep, CurrentUser, query_budget
+from app.api.export import export_response
+from app.api.pagination import decode_cursor, encode_cursor
+from app.api.serialization import dump_rows
+from app.core import catalog
+from app.core.db import AsyncDB, replicas
+from app.importing import ImportFormatError, iter_records
 from app.models import (
+    CountMode,
+    Difficulty,
+    ExportFormat,
     Message,
     Problem,
+    ProblemContentBase,
     ProblemCreate,
+    ProblemDetail,
+    ProblemImportError,
     ProblemPublic,
+    ProblemSearchHit,
+    ProblemSearchResults,
+    ProblemSortField,
     ProblemUpdate,
-    ProblemsPublic
+    ProblemsBulkDelete,
+    ProblemsBulkResult,
+    ProblemsBulkUpdate,
+    ProblemsImported,
+    ProblemsPublic,
+    SortOrder
 )
 
 router = APIRouter(prefix="/problems", tags=["problems"])
 
-@router.get("/", response_model=ProblemsPublic)
-def get_problems(
-        session: SessionDep,
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+
+async def _detail_json(db: AsyncDB, problem: Problem) -> bytes:
+    # The catalog holds only the compact row, the content is read on demand.
+    # It comes from the primary like catalog misses, so it matches the version.
+    content = await db.run(crud.get_problem_content, problem_id=problem.id)
+    detail = ProblemDetail.model_validate(problem)
+    if content is not None:
+        detail.content = ProblemContentBase.model_validate(content)
+    return detail.model_dump_json().encode()
+
+
+def _bulk_result(requested: list[uuid.UUID], changed: list[uuid.UUID]) -> ProblemsBulkResult:
+    found = set(changed)
+    return ProblemsBulkResult(
+        ids=sorted(found, key=str),
+        count=len(found),
+        missing_ids=sorted({id for id in requested if id not in found}, key=str)
+    )
+
+
+@router.get("/", response_model=ProblemsPublic, dependencies=[query_budget(5)])
+async def get_problems(
+        request: Request,
+        db: AsyncSessionDep,
         current_user: CurrentUser,
-        skip: int = 0,
-        limit: int = 100
-) -> Any:
+        cursor: str | None = None,
+        limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+        difficulty: Difficulty | None = None,
+        sort_by: ProblemSortField = ProblemSortField.NUMBER,
+        order: SortOrder = SortOrder.ASC,
+        count: CountMode = CountMode.EXACT
+) -> Response:
     """
-    Retrieve a paginated list of all LeetCode problems (admin only).
+    Retrieve a cursor-paginated list of all LeetCode problems (admin only).
 
-    - **session**: Database session dependency.
+    - **request**: Incoming request, for `If-None-Match` and `Accept-Encoding`.
+    - **db**: Async database session dependency.
     - **current_user**: The authenticated user making the request.
-    - **skip**: Number of items to skip for pagination.
+    - **cursor**: Opaque `next_cursor` from the previous page, omit for the first page.
     - **limit**: Maximum number of items to return.
+    - **difficulty**: Only return problems of this difficulty.
+    - **sort_by**: Column to sort by, `number` or `name`.
+    - **order**: Sort direction, `asc` or `desc`.
+    - **count**: `exact` runs COUNT(*), `estimate` uses planner statistics and `none` skips counting.
+
+    Pages carry an ETag that changes whenever the catalog does, so clients can
+    revalidate with `If-None-Match` and get a 304. Bodies are cached per
+    catalog version, already serialized and compressed. Rows are written to
+    JSON directly, without building and validating a model per problem.
 
     Only superusers are allowed to access this endpoint.
     """
-    if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Problem)
-        count = session.exec(count_statement).one()
-        statement = select(Problem).offset(skip).limit(limit)
-        problems = session.exec(statement).all()
-    else:
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="Only admins can see this page"
         )
-    return ProblemsPublic(data=problems, count=count)
+    columns = crud.problem_keyset_columns(sort_by)
+    cursor_key = f"problems:{sort_by.value}:{order.value}"
+    # Cursor values have the JSON type of the public field, int or str
+    types = [ProblemPublic.model_fields[column.key].annotation for column in columns]
+    after = decode_cursor(cursor, cursor_key, types) if cursor else None
+    key = f"problems:{cursor}:{limit}:{difficulty}:{sort_by.value}:{order.value}:{count.value}"
+
+    async def build() -> bytes:
+        # The version may come from the primary's notifications; a replica
+        # that has not replayed it yet would cache old rows under the new tag
+        read = db.read
+        if replicas.replicas and await db.read(crud.get_catalog_version) < version:
+            read = db.run
+        total = await read(crud.count_problems, mode=count, difficulty=difficulty)
+        # Fetch one extra row to know whether another page follows
+        problems = await read(
+            crud.get_problems,
+            limit=limit + 1,
+            after=after,
+            difficulty=difficulty,
+            sort_by=sort_by,
+            order=order
+        )
+        next_cursor = None
+        if len(problems) > limit:
+            problems = problems[:limit]
+            last = problems[-1]
+            next_cursor = encode_cursor(
+                cursor_key, [getattr(last, column.key) for column in columns]
+            )
+        return dump_rows(problems, count=total, next_cursor=next_cursor)
+
+    version = await catalog.get_catalog_version(db)
+    return await catalog_response(request, version=version, key=key, build=build)
 
 
-@router.get("/{id}", response_model=ProblemPublic)
-def get_problem(
-        session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+@router.get(
+    "/search", response_model=ProblemSearchResults, dependencies=[query_budget(2)]
+)
+async def search_problems(
+        db: AsyncSessionDep,
+        current_user: CurrentUser,
+        q: Annotated[str, Query(min_length=1, max_length=255)],
+        skip: Annotated[int, Query(ge=0, le=1000)] = 0,
+        limit: Annotated[int, Query(ge=1, le=100)] = 20
 ) -> Any:
+    """
+    Search LeetCode problems by name and description, best matches first (admin only).
+
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+    - **q**: Search text; supports web-search syntax such as `"two sum" -linked`.
+    - **skip**: Number of ranked results to skip for pagination.
+    - **limit**: Maximum number of items to return.
+
+    Combines full-text ranking with trigram similarity on the name, so
+    misspelled names still match. Every match has to be ranked before the
+    page is cut, so pagination is offset based and capped.
+
+    Only superusers are allowed to access this endpoint.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403, detail="Only admins can see this page"
+        )
+    results = await db.read(crud.search_problems, query=q, skip=skip, limit=limit)
+    return ProblemSearchResults(
+        data=[
+            ProblemSearchHit.model_validate(problem, update={"rank": rank})
+            for problem, rank in results
+        ]
+    )
+
+
+@router.get("/export", dependencies=[query_budget(1)])
+async def export_problems(
+        request: Request,
+        db: AsyncSessionDep,
+        current_user: CurrentUser,
+        format: ExportFormat = ExportFormat.NDJSON,
+        difficulty: Difficulty | None = None
+) -> StreamingResponse:
+    """
+    Download the whole catalog as NDJSON or CSV, ordered by number (admin only).
+
+    - **request**: Incoming request, for `Accept-Encoding`.
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+    - **format**: `ndjson`, one JSON object per line, or `csv` with a header row.
+    - **difficulty**: Only export problems of this difficulty.
+
+    The response is streamed from a server-side cursor, so it starts at once
+    and needs no paging. It is gzip encoded when the client accepts it.
+
+    Only superusers are allowed to access this endpoint.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403, detail="Only admins can see this page"
+        )
+    return export_response(
+        request,
+        db,
+        crud.problems_export_query(difficulty=difficulty),
+        format=format,
+        filename="problems"
+    )
+
+
+@router.get("/{id}", response_model=ProblemDetail, dependencies=[query_budget(4)])
+async def get_problem(
+        request: Request, db: AsyncSessionDep, current_user: CurrentUser, id: uuid.UUID
+) -> Response:
     """
     Retrieve a single LeetCode problem by its ID (admin only).
 
-    - **session**: Database session dependency.
+    - **request**: Incoming request, for `If-None-Match` and `Accept-Encoding`.
+    - **db**: Async database session dependency.
     - **current_user**: The authenticated user making the request.
     - **id**: UUID of the problem to retrieve.
 
+    Returns the problem with its long-form `content`, which list and search
+    results leave out. Supports `If-None-Match` revalidation like the list
+    endpoint.
+
+    Only superusers are allowed to access this endpoint.
+    """
+    # Checked first so a 304 never confirms a problem exists to non-admins
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403, detail="Only admins can see this page"
+        )
+
+    async def build() -> bytes:
+        problem = await catalog.get_problem(db, id=id)
+        if not problem:
+            raise HTTPException(status_code=404, detail="Problem not found")
+        return await _detail_json(db, problem)
+
+    version = await catalog.get_catalog_version(db)
+    return await catalog_response(request, version=version, key=f"problem:{id}", build=build)
+
+
+@router.get(
+    "/number/{number}", response_model=ProblemDetail, dependencies=[query_budget(4)]
+)
+async def get_problem_by_number(
+        request: Request, db: AsyncSessionDep, current_user: CurrentUser, number: int
+) -> Response:
+    """
+    Retrieve a single LeetCode problem by its number (admin only).
+
+    - **request**: Incoming request, for `If-None-Match` and `Accept-Encoding`.
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+    - **number**: LeetCode number of the problem to retrieve.
+
+    Returns the problem with its long-form `content`, like `GET /problems/{id}`.
+
     Only superusers are allowed to access this endpoint.
     """
-    problem = session.get(Problem, id)
-    if not problem:
-        raise HTTPException(status_code=404, detail="Problem not found")
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="Only admins can see this page"
         )
-    return problem
 
+    async def build() -> bytes:
+        problem = await catalog.get_problem_by_number(db, number=number)
+        if not problem:
+            raise HTTPException(status_code=404, detail="Problem not found")
+        return await _detail_json(db, problem)
 
-@router.post("/", response_model=ProblemPublic)
-def create_problem(
-        *, session: SessionDep, current_user: CurrentUser, problem_in: ProblemCreate
+    version = await catalog.get_catalog_version(db)
+    return await catalog_response(
+        request, version=version, key=f"problem-number:{number}", build=build
+    )
+
+
+@router.post("/", response_model=ProblemPublic, dependencies=[query_budget(5)])
+async def create_problem(
+        *, db: AsyncSessionDep, current_user: CurrentUser, problem_in: ProblemCreate
 ) -> Any:
     """
     Create a new LeetCode problem (admin only).
 
-    - **session**: Database session dependency.
+    - **db**: Async database session dependency.
     - **current_user**: The authenticated user making the request.
     - **problem_in**: Data required to create the problem.
 
     Only superusers are allowed to access this endpoint.
     """
-    problem = Problem.model_validate(problem_in)
-    session.add(problem)
-    session.commit()
-    session.refresh(problem)
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403, detail="Only admins can see this page"
+        )
+    problem = await db.run(crud.create_problem, problem_create=problem_in)
     return problem
 
 
-@router.put("/{id}", response_model=ProblemPublic)
-def update_problem(
-        session: SessionDep,
+@router.post("/bulk", response_model=ProblemsImported)
+async def import_problems(
+        request: Request, db: AsyncSessionDep, current_user: CurrentUser
+) -> Any:
+    """
+    Create or update many LeetCode problems from one upload (admin only).
+
+    - **request**: Body with one `ProblemCreate` per row, sent as a JSON array
+      (`application/json`), NDJSON (`application/x-ndjson`) or CSV with a header
+      row (`text/csv`).
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+
+    Rows are validated as they stream in and upserted by `number` in batches
+    of multi-row `INSERT ... ON CONFLICT DO UPDATE`, each batch in its own
+    transaction. Invalid rows are skipped and reported by row number. JSON
+    rows may carry `content`, which replaces the problem's long-form text.
+
+    A 400 means nothing was written. An upload that becomes unreadable
+    after some rows keeps the rows read before that point. The format error
+    is then reported in `errors` against the row where reading stopped.
+
+    Only superusers are allowed to access this endpoint.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403, detail="Only admins can see this page"
+        )
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    imported = failed = 0
+    errors: list[ProblemImportError] = []
+    batch: list[ProblemCreate] = []
+
+    def reject(row: int, detail: str) -> None:
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append(ProblemImportError(row=row, detail=detail))
+
+    row = 0
+    try:
+        async for row, record in iter_records(request.stream(), media_type):
+            if isinstance(record, str):
+                reject(row, record)
+                continue
+            try:
+                batch.append(ProblemCreate.model_validate(record))
+            except ValidationError as e:
+                reject(row, "; ".join(
+                    f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                    for error in e.errors()
+                ))
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                imported += await db.run(crud.upsert_problems, problems=batch)
+                batch = []
+    except ImportFormatError as e:
+        if not imported and not batch:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Earlier batches are committed already, so report the error with them
+        reject(row + 1, str(e))
+    if batch:
+        imported += await db.run(crud.upsert_problems, problems=batch)
+    return ProblemsImported(imported=imported, failed=failed, errors=errors)
+
+
+@router.post(
+    "/bulk/update", response_model=ProblemsBulkResult, dependencies=[query_budget(2)]
+)
+async def update_problems(
+        db: AsyncSessionDep, current_user: CurrentUser, bulk_in: ProblemsBulkUpdate
+) -> Any:
+    """
+    Apply one patch to many LeetCode problems at once (admin only).
+
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+    - **bulk_in**: Up to 1000 problem ids and the fields to set on all of them.
+
+    All problems are updated by a single statement, together with the
+    counters of users whose solves changed difficulty. Ids that match no
+    problem are listed in `missing_ids`.
+
+    Only superusers are allowed to access this endpoint.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403, detail="Only admins can see this page"
+        )
+    ids = await db.run(
+        crud.update_problems, ids=list(set(bulk_in.ids)), patch=bulk_in.patch
+    )
+    return _bulk_result(bulk_in.ids, ids)
+
+
+@router.post(
+    "/bulk/delete", response_model=ProblemsBulkResult, dependencies=[query_budget(2)]
+)
+async def delete_problems(
+        db: AsyncSessionDep, current_user: CurrentUser, bulk_in: ProblemsBulkDelete
+) -> Any:
+    """
+    Delete many LeetCode problems at once (admin only).
+
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+    - **bulk_in**: Up to 1000 problem ids.
+
+    All problems are deleted by a single statement, their solves cascade and
+    the solvers' counters are recounted in the same statement.
+    Ids that match no problem are listed in `missing_ids`.
+
+    Only superusers are allowed to access this endpoint.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403, detail="Only admins can see this page"
+        )
+    ids = await db.run(crud.delete_problems, ids=list(set(bulk_in.ids)))
+    return _bulk_result(bulk_in.ids, ids)
+
+
+@router.put("/{id}", response_model=ProblemPublic, dependencies=[query_budget(2)])
+async def update_problem(
+        db: AsyncSessionDep,
         current_user: CurrentUser,
         id: uuid.UUID,
         problem_in: ProblemUpdate
@@ -98,48 +429,46 @@ def update_problem(
     """
     Update an existing LeetCode problem by its ID (admin only).
 
-    - **session**: Database session dependency.
+    - **db**: Async database session dependency.
     - **current_user**: The authenticated user making the request.
     - **id**: UUID of the problem to update.
     - **problem_in**: Fields to update.
 
+    The problem, its content and the counters of its solvers are updated,
+    and the problem returned, by a single statement.
+
     Only superusers are allowed to access this endpoint.
     """
-    problem = session.get(Problem, id)
-    if not problem:
-        raise HTTPException(status_code=404, detail="Problem not found")
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="Only admins can see this page"
         )
-    update_dict = problem_in.model_dump(exclude_unset=True)
-    problem.sqlmodel_update(update_dict)
-    session.add(problem)
-    session.commit()
-    session.refresh(problem)
+    problem = await db.run(crud.update_problem, id=id, problem_update=problem_in)
+    if not problem:
+        raise HTTPException(status_code=404, detail="Problem not found")
     return problem
 
 
-@router.delete("/{id}")
-def delete_problem(
-        session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+@router.delete("/{id}", dependencies=[query_budget(2)])
+async def delete_problem(
+        db: AsyncSessionDep, current_user: CurrentUser, id: uuid.UUID
 ) -> Message:
     """
     Delete a LeetCode problem by its ID (admin only).
 
-    - **session**: Database session dependency.
+    - **db**: Async database session dependency.
     - **current_user**: The authenticated user making the request.
     - **id**: UUID of the problem to delete.
 
+    The problem is deleted, and the counters of its solvers recounted, by a
+    single statement.
+
     Only superusers are allowed to access this endpoint.
     """
-    problem = session.get(Problem, id)
-    if not problem:
-        raise HTTPException(status_code=404, detail="Problem not found")
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="Only admins can see this page"
         )
-    session.delete(problem)
-    session.commit()
-    return Message(message="Problem deleted")
\ No newline at end of file
+    if not await db.run(crud.delete_problem, id=id):
+        raise HTTPException(status_code=404, detail="Problem not found")
+    return Message(message="Problem deleted")
@@ -1,3 +1,193 @@
-from fastapi import APIRouter
+import uuid
+from datetime import datetime
+from typing import Annotated, Any
 
-router = APIRouter(prefix="/users", tags=["users"])
\ No newline at end of file
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app import crud
+from app.api.deps import AsyncSessionDep, CurrentUser, query_budget
+from app.api.export import export_response
+from app.api.pagination import decode_cursor, encode_cursor
+from app.core import catalog
+from app.models import (
+    ExportFormat,
+    ProblemPublic,
+    ProblemSolvedCreate,
+    ProblemSolvedPublic,
+    ProblemSolvedBatchEntry,
+    ProblemsSolvedBatchCreate,
+    ProblemsSolvedBatchResult,
+    ProblemsSolvedPublic,
+    UserStatsPublic
+)
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+SOLVES_CURSOR_KEY = "solves"
+
+
+@router.post(
+    "/me/solves", response_model=ProblemSolvedPublic, dependencies=[query_budget(3)]
+)
+async def record_solve(
+        db: AsyncSessionDep,
+        current_user: CurrentUser,
+        solve_in: ProblemSolvedCreate,
+        response: Response
+) -> Any:
+    """
+    Mark a LeetCode problem as solved by the current user.
+
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+    - **solve_in**: The problem that was solved.
+
+    Returns 201 for a new solve and 200 if it was already recorded. The
+    user's solve counters are updated by the same statement, using the
+    problem's difficulty as stored.
+    """
+    problem = await catalog.get_problem(db, id=solve_in.problem_id)
+    if not problem:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    solve, created = await db.run(
+        crud.record_solve, user_id=current_user.id, problem=problem
+    )
+    response.status_code = 201 if created else 200
+    return ProblemSolvedPublic(
+        id=solve.id,
+        solved_at=solve.solved_at,
+        problem=ProblemPublic.model_validate(problem)
+    )
+
+
+@router.post(
+    "/me/solves/batch",
+    response_model=ProblemsSolvedBatchResult,
+    dependencies=[query_budget(2)]
+)
+async def record_solves(
+        db: AsyncSessionDep,
+        current_user: CurrentUser,
+        batch_in: ProblemsSolvedBatchCreate
+) -> Any:
+    """
+    Mark many LeetCode problems as solved by the current user at once.
+
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+    - **batch_in**: Up to 1000 problem ids and up to 1000 problem numbers.
+
+    Everything is recorded in a single statement. Each resolved problem is
+    reported with `created` set only if this request recorded it, so a
+    retried upload is safe and reports nothing new. References that match
+    no problem are listed in `missing_ids` and `missing_numbers`.
+    """
+    rows = await db.run(
+        crud.record_solves,
+        user_id=current_user.id,
+        problem_ids=list(set(batch_in.problem_ids)),
+        numbers=list(set(batch_in.numbers))
+    )
+    data = [
+        ProblemSolvedBatchEntry(problem_id=id, number=number, created=created)
+        for id, number, created in rows
+    ]
+    found_ids = {entry.problem_id for entry in data}
+    found_numbers = {entry.number for entry in data}
+    return ProblemsSolvedBatchResult(
+        data=data,
+        created=sum(entry.created for entry in data),
+        missing_ids=sorted({id for id in batch_in.problem_ids if id not in found_ids}, key=str),
+        missing_numbers=sorted({n for n in batch_in.numbers if n not in found_numbers})
+    )
+
+
+@router.get(
+    "/me/solves", response_model=ProblemsSolvedPublic, dependencies=[query_budget(2)]
+)
+async def get_solves(
+        db: AsyncSessionDep,
+        current_user: CurrentUser,
+        cursor: str | None = None,
+        limit: Annotated[int, Query(ge=1, le=1000)] = 100
+) -> Any:
+    """
+    Retrieve the current user's solved problems, most recent first.
+
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+    - **cursor**: Opaque `next_cursor` from the previous page, omit for the first page.
+    - **limit**: Maximum number of items to return.
+    """
+    before = None
+    if cursor:
+        solved_at, id = decode_cursor(cursor, SOLVES_CURSOR_KEY, (str, str))
+        try:
+            before = (datetime.fromisoformat(solved_at), uuid.UUID(id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = await db.read(
+        crud.get_solves, user_id=current_user.id, limit=limit + 1, before=before
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, _ = rows[-1]
+        next_cursor = encode_cursor(
+            SOLVES_CURSOR_KEY, [last.solved_at.isoformat(), str(last.id)]
+        )
+    return ProblemsSolvedPublic(
+        data=[
+            ProblemSolvedPublic(
+                id=solve.id,
+                solved_at=solve.solved_at,
+                problem=ProblemPublic.model_validate(problem)
+            )
+            for solve, problem in rows
+        ],
+        next_cursor=next_cursor
+    )
+
+
+@router.get("/me/solves/export", dependencies=[query_budget(1)])
+async def export_solves(
+        request: Request,
+        db: AsyncSessionDep,
+        current_user: CurrentUser,
+        format: ExportFormat = ExportFormat.NDJSON
+) -> StreamingResponse:
+    """
+    Download the current user's solve history as NDJSON or CSV, newest first.
+
+    - **request**: Incoming request, for `Accept-Encoding`.
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+    - **format**: `ndjson`, one JSON object per line, or `csv` with a header row.
+
+    The response is streamed from a server-side cursor, so it starts at once
+    and needs no paging. It is gzip encoded when the client accepts it.
+    """
+    return export_response(
+        request,
+        db,
+        crud.solves_export_query(user_id=current_user.id),
+        format=format,
+        filename="solves"
+    )
+
+
+@router.get("/me/stats", response_model=UserStatsPublic, dependencies=[query_budget(2)])
+async def get_stats(db: AsyncSessionDep, current_user: CurrentUser) -> Any:
+    """
+    Retrieve the current user's solve totals per difficulty.
+
+    - **db**: Async database session dependency.
+    - **current_user**: The authenticated user making the request.
+
+    Reads the precomputed summary row instead of aggregating the solve log.
+    """
+    stats = await db.read(crud.get_user_stats, user_id=current_user.id)
+    if not stats:
+        return UserStatsPublic()
+    return stats
@@ -0,0 +1,18 @@
+from collections.abc import Sequence
+from typing import Any
+
+import orjson
+from sqlalchemy import Row
+
+
+def dump_rows(rows: Sequence[Row[Any]], **fields: Any) -> bytes:
+    """
+    Serialize `{"data": rows, **fields}` to JSON straight from result rows.
+
+    Each row becomes an object keyed by its column labels. Nothing is
+    validated on the way, so the selected columns have to match the public
+    model already (see `crud.PROBLEM_PUBLIC_COLUMNS`). orjson writes UUIDs,
+    enums and datetimes natively.
+    """
+    keys = rows[0]._fields if rows else ()
+    return orjson.dumps({"data": [dict(zip(keys, row)) for row in rows], **fields})
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import namedtuple
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any
+
+import jwt
+from fastapi.routing import APIRoute
+from sqlmodel import Session
+from starlette.routing import BaseRoute
+
+from app.api.serialization import dump_rows
+from app.core import security
+from app.core.config import settings
+from app.core.db import engine, init_db, warm_pools
+from app.core.security import password_hash_pool
+from app.crud import PROBLEM_PUBLIC_COLUMNS
+from app.models import (
+    Message,
+    ProblemDetail,
+    ProblemPublic,
+    ProblemSearchResults,
+    ProblemsBulkResult,
+    ProblemsImported,
+    ProblemSolvedPublic,
+    ProblemsPublic,
+    ProblemsSolvedBatchResult,
+    ProblemsSolvedPublic,
+    Token,
+    UserPublic,
+    UserStatsPublic,
+    utc_now
+)
+from app.utils import load_email_templates
+
+logger = logging.getLogger(__name__)
+
+# Delay between attempts while the database is unreachable, doubled up to the cap
+RETRY_SECONDS = 1.0
+MAX_RETRY_SECONDS = 30.0
+
+_ID = uuid.UUID(int=0)
+_PROBLEM = {
+    "id": _ID, "number": 1, "name": "Warm-up", "description": None, "difficulty": "easy"
+}
+_ProblemRow = namedtuple("_ProblemRow", [column.key for column in PROBLEM_PUBLIC_COLUMNS])
+
+# One valid instance per response model, run through each route's response
+# field the way FastAPI serializes a real response
+RESPONSE_SAMPLES: dict[Any, Any] = {
+    ProblemPublic: _PROBLEM,
+    ProblemDetail: {**_PROBLEM, "content": {"statement": "Warm-up"}},
+    ProblemsPublic: {"data": [_PROBLEM], "count": 1, "next_cursor": None},
+    ProblemSearchResults: {"data": [{**_PROBLEM, "rank": 1.0}]},
+    ProblemsImported: {"imported": 1, "failed": 0, "errors": []},
+    ProblemsBulkResult: {"ids": [_ID], "count": 1, "missing_ids": []},
+    ProblemSolvedPublic: {"id": _ID, "solved_at": utc_now(), "problem": _PROBLEM},
+    ProblemsSolvedPublic: {
+        "data": [{"id": _ID, "solved_at": utc_now(), "problem": _PROBLEM}],
+        "next_cursor": None
+    },
+    ProblemsSolvedBatchResult: {
+        "data": [{"problem_id": _ID, "number": 1, "created": True}], "created": 1
+    },
+    UserStatsPublic: {},
+    UserPublic: {"id": _ID},
+    Token: {"access_token": "warm-up"},
+    Message: {"message": "warm-up"},
+}
+
+
+class Readiness:
+    """Whether this worker finished warming up, reported by `GET /ready`."""
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.attempts = 0
+        self.last_error: str | None = None
+        # Milliseconds per warm-up step of the last attempt
+        self.steps: dict[str, float] = {}
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "steps_ms": self.steps
+        }
+
+
+readiness = Readiness()
+
+
+@contextmanager
+def _step(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    yield
+    readiness.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def warm_serializers(routes: Iterable[BaseRoute]) -> int:
+    """Validate and serialize a sample of every route's response model, returns the count."""
+    warmed = 0
+    for route in routes:
+        if not isinstance(route, APIRoute) or route.response_field is None:
+            continue
+        sample = RESPONSE_SAMPLES.get(route.response_model)
+        if sample is None:
+            logger.debug("No warm-up sample for %s %s", route.methods, route.path)
+            continue
+        value, errors = route.response_field.validate(sample, {}, loc=("response",))
+        if errors:
+            raise RuntimeError(f"Invalid warm-up sample for {route.path}: {errors}")
+        route.response_field.serialize(value, mode="json")
+        warmed += 1
+    # List endpoints skip the response model and write rows directly
+    dump_rows([_ProblemRow(**_PROBLEM)], count=1, next_cursor=None)
+    return warmed
+
+
+def _init_db() -> str:
+    with Session(engine) as session:
+        return init_db(session).hashed_password
+
+
+async def warm_up(routes: Iterable[BaseRoute]) -> None:
+    """
+    Pay the first-request costs of a fresh worker up front.
+
+    Opens pool connections, makes sure the first superuser exists, serializes
+    every response model once, compiles the email templates, signs and decodes
+    a token, and runs one bcrypt verify in the hash pool, which loads the
+    passlib backend and starts its executor. Every step is idempotent.
+    """
+    with _step("db_pool"):
+        await warm_pools()
+    with _step("init_db"):
+        hashed_password = await asyncio.to_thread(_init_db)
+    with _step("serializers"):
+        warm_serializers(routes)
+    with _step("email_templates"):
+        await asyncio.to_thread(load_email_templates)
+    with _step("jwt"):
+        token = security.create_access_token(_ID, timedelta(minutes=1))
+        jwt.decode(token, settings.SECRET_KEY, algorithms=[security.ALGORITHM])
+    with _step("bcrypt"):
+        await password_hash_pool.verify("warm-up", hashed_password)
+
+
+async def run_warm_up(routes: Iterable[BaseRoute]) -> None:
+    """Run `warm_up` until it succeeds, then mark the worker ready."""
+    routes = list(routes)
+    delay = RETRY_SECONDS
+    started = time.perf_counter()
+    while True:
+        readiness.attempts += 1
+        try:
+            await warm_up(routes)
+        except Exception as e:
+            readiness.last_error = repr(e)
+            logger.warning(
+                "Warm-up attempt %d failed, retrying in %.0fs",
+                readiness.attempts, delay, exc_info=True
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_SECONDS)
+            continue
+        readiness.last_error = None
+        readiness.ready = True
+        logger.info(
+            "Ready after %.2fs, steps in ms: %s", time.perf_counter() - started, readiness.steps
+        )
+        return
@@ -0,0 +1,101 @@
+"""
+Report how long `import app.main` takes and fail when it is over budget.
+
+Run from the backend directory:
+
+    python -m app.benchmarks.importtime --budget-ms 1500 --runs 5
+
+Every run imports the app in a fresh interpreter with `-X importtime`, which
+is what a new worker pays before it can serve. The report shows the median
+total and the top-level packages that cost the most on their own. The exit
+status is 1 when the median is over `--budget-ms`, or when a module that
+should only load on first use (the synchronous mail stack) is imported at
+startup, so the check can run in CI.
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+
+# Only needed when mail is sent synchronously, see `app.utils.send_email`
+LAZY_MODULES = ("emails", "premailer", "lxml", "cssutils", "requests", "dns")
+
+# import time: self [us] | cumulative | imported package
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+@dataclass
+class ImportProfile:
+    # Cumulative microseconds of the profiled module
+    total_us: int = 0
+    # Self microseconds per top-level package
+    packages: Counter[str] = field(default_factory=Counter)
+    modules: set[str] = field(default_factory=set)
+
+
+def parse(stderr: str, module: str) -> ImportProfile:
+    profile = ImportProfile()
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        profile.modules.add(name)
+        profile.packages[name.partition(".")[0]] += int(self_us)
+        if name == module:
+            profile.total_us = int(cumulative_us)
+    return profile
+
+
+def profile_import(module: str) -> ImportProfile:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=False
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse(result.stderr, module)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument(
+        "--budget-ms", type=float, default=None, help="Fail when the median is above this"
+    )
+    parser.add_argument("--top", type=int, default=15, help="Packages to list")
+    args = parser.parse_args()
+
+    profiles = [profile_import(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(profile.total_us for profile in profiles) / 1000
+    # Self time per package is taken from the fastest run, the least noisy one
+    fastest = min(profiles, key=lambda profile: profile.total_us)
+
+    print(f"{'package':<28} {'self ms':>8}")
+    for package, self_us in fastest.packages.most_common(args.top):
+        print(f"{package:<28} {self_us / 1000:>8.1f}")
+    print(f"\nimport {args.module}: median {median_ms:.1f}ms over {args.runs} runs")
+
+    failed = False
+    eager = sorted({name.partition(".")[0] for name in fastest.modules} & set(LAZY_MODULES))
+    if eager:
+        print(f"FAIL: imported at startup, should load on first use: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None:
+        if median_ms > args.budget_ms:
+            print(f"FAIL: over the budget of {args.budget_ms:.0f}ms")
+            failed = True
+        else:
+            print(f"OK: within the budget of {args.budget_ms:.0f}ms")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
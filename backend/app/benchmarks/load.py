@@ -0,0 +1,432 @@
+"""
+Load test the API and fail when it is slower than a stored baseline.
+
+Run from the backend directory against a dedicated, migrated database (the
+usual POSTGRES_* settings), ideally on the machine the baseline came from:
+
+    python -m app.benchmarks.load --save-baseline   # record a baseline
+    python -m app.benchmarks.load                   # compare, exit 1 on regression
+    python -m app.benchmarks.load --ci              # also exit 1 without a baseline
+
+`app.main:app` is started with uvicorn in a subprocess, so the client does not
+compete with the server for the GIL. Users and problems are seeded first,
+then each scenario sends a fixed number of requests at a fixed concurrency
+and reports throughput and latency percentiles. Password recovery mail goes to
+a local SMTP sink, so no real mail server is needed. The row serialization
+micro-benchmark is measured and compared with the same baseline.
+
+Baselines depend on the machine, so none is committed; record one on the CI
+runner. With `--ci` (the default when the CI environment variable is set) a
+missing baseline, or one without a result for a scenario that ran, fails the
+run instead of passing it unchecked.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import httpx
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, func, select
+
+from app import crud
+from app.benchmarks.serialization import make_rows, measure
+from app.api.serialization import dump_rows
+from app.core.config import settings
+from app.core.db import engine
+from app.core.security import get_password_hash
+from app.models import Difficulty, Problem, ProblemCreate, User
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+PASSWORD = "bench-password"
+ADMIN_EMAIL = "bench-admin@example.com"
+
+
+def user_email(index: int) -> str:
+    return f"bench-user-{index}@example.com"
+
+
+@dataclass
+class BenchContext:
+    client: httpx.AsyncClient
+    rng: random.Random
+    users: int
+    problem_ids: list[uuid.UUID]
+    admin_headers: dict[str, str]
+    next_number: int
+
+
+@dataclass
+class Scenario:
+    name: str
+    requests: int
+    send: Callable[[BenchContext], Awaitable[httpx.Response]]
+
+
+async def login(ctx: BenchContext) -> httpx.Response:
+    email = user_email(ctx.rng.randrange(ctx.users))
+    return await ctx.client.post(
+        "/api/v1/login/access-token", data={"username": email, "password": PASSWORD}
+    )
+
+
+async def list_problems(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.get(
+        "/api/v1/problems/", params={"limit": 100}, headers=ctx.admin_headers
+    )
+
+
+async def get_problem(ctx: BenchContext) -> httpx.Response:
+    id = ctx.rng.choice(ctx.problem_ids)
+    return await ctx.client.get(f"/api/v1/problems/{id}", headers=ctx.admin_headers)
+
+
+async def create_problem(ctx: BenchContext) -> httpx.Response:
+    number = ctx.next_number
+    ctx.next_number += 1
+    return await ctx.client.post(
+        "/api/v1/problems/",
+        json={"number": number, "name": f"Bench created {number}"},
+        headers=ctx.admin_headers
+    )
+
+
+async def recover_password(ctx: BenchContext) -> httpx.Response:
+    email = user_email(ctx.rng.randrange(ctx.users))
+    return await ctx.client.post(f"/api/v1/password-recovery/{email}")
+
+
+# Request counts are scaled by --scale; bcrypt bound scenarios get fewer
+SCENARIOS = [
+    Scenario("login", 200, login),
+    Scenario("list_problems", 2000, list_problems),
+    Scenario("get_problem", 2000, get_problem),
+    Scenario("create_problem", 1000, create_problem),
+    Scenario("recover_password", 500, recover_password),
+]
+
+
+class SMTPSink:
+    """Minimal SMTP server that accepts and counts every message."""
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self.port = 0
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in self._writers:
+                writer.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        writer.write(b"220 bench ESMTP\r\n")
+        while line := await reader.readline():
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                writer.write(b"250-bench\r\n250 AUTH PLAIN LOGIN\r\n")
+            elif command == b"AUTH":
+                writer.write(b"235 Authenticated\r\n")
+            elif command == b"DATA":
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                while (await reader.readline()) not in (b".\r\n", b""):
+                    pass
+                self.messages += 1
+                writer.write(b"250 Queued\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        self._writers.discard(writer)
+        writer.close()
+
+
+def seed(users: int, problems: int) -> tuple[list[uuid.UUID], int]:
+    """Idempotently create the bench users and problems numbered 1..problems."""
+    hashed_password = get_password_hash(PASSWORD)
+    with Session(engine) as session:
+        rows = [
+            {"id": uuid.uuid4(), "email": user_email(index), "hashed_password": hashed_password}
+            for index in range(users)
+        ]
+        rows.append({
+            "id": uuid.uuid4(),
+            "email": ADMIN_EMAIL,
+            "hashed_password": hashed_password,
+            "is_superuser": True
+        })
+        for row in rows:
+            row.setdefault("is_superuser", False)
+        session.exec(
+            insert(User).on_conflict_do_nothing(index_elements=[User.email]), params=rows
+        )
+        session.commit()
+        difficulties = list(Difficulty)
+        for start in range(1, problems + 1, 1000):
+            crud.upsert_problems(session=session, problems=[
+                ProblemCreate(
+                    number=number,
+                    name=f"Bench problem {number}",
+                    difficulty=difficulties[number % len(difficulties)]
+                )
+                for number in range(start, min(start + 1000, problems + 1))
+            ])
+        ids = session.exec(select(Problem.id).where(Problem.number <= problems)).all()
+        next_number = (session.exec(select(func.max(Problem.number))).one() or 0) + 1
+    return list(ids), next_number
+
+
+def remove_created(first_number: int) -> None:
+    with Session(engine) as session:
+        session.exec(delete(Problem).where(Problem.number >= first_number))
+        crud.bump_catalog_version(session=session)
+        session.commit()
+
+
+def start_server(port: int, workers: int, smtp_port: int) -> subprocess.Popen[bytes]:
+    env = {
+        **os.environ,
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_TLS": "false",
+        "SMTP_SSL": "false",
+        "EMAILS_FROM_EMAIL": "bench@example.com"
+    }
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--workers", str(workers),
+            "--log-level", "warning",
+            "--no-access-log"
+        ],
+        env=env
+    )
+
+
+async def wait_until_up(client: httpx.AsyncClient, server: subprocess.Popen[bytes]) -> None:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start within 30 seconds")
+
+
+async def run_scenario(
+        ctx: BenchContext, scenario: Scenario, requests: int, concurrency: int
+) -> dict[str, float]:
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await scenario.send(ctx)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    problem_ids, next_number = seed(args.users, args.problems)
+    sink = SMTPSink()
+    await sink.start()
+    server = start_server(args.port, args.workers, sink.port)
+    results: dict[str, Any] = {}
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}",
+            timeout=60,
+            limits=httpx.Limits(max_connections=args.concurrency)
+        ) as client:
+            await wait_until_up(client, server)
+            response = await client.post(
+                "/api/v1/login/access-token",
+                data={"username": ADMIN_EMAIL, "password": PASSWORD}
+            )
+            response.raise_for_status()
+            ctx = BenchContext(
+                client=client,
+                rng=random.Random(args.seed),
+                users=args.users,
+                problem_ids=problem_ids,
+                admin_headers={"Authorization": f"Bearer {response.json()['access_token']}"},
+                next_number=next_number
+            )
+            for scenario in SCENARIOS:
+                if scenario.name not in args.scenarios:
+                    continue
+                requests = max(1, int(scenario.requests * args.scale))
+                # Warm up connections and caches outside the measurement
+                await run_scenario(ctx, scenario, min(requests, args.concurrency), args.concurrency)
+                results[scenario.name] = await run_scenario(
+                    ctx, scenario, requests, args.concurrency
+                )
+                print_result(scenario.name, results[scenario.name])
+    finally:
+        server.terminate()
+        # The server says goodbye to the sink on shutdown, keep the loop running
+        await asyncio.to_thread(server.wait, 30)
+        await sink.stop()
+        remove_created(next_number)
+    rows = make_rows(1000)
+    results["dump_rows_1000"] = {
+        "rows_per_second": measure(lambda: dump_rows(rows, count=1000), 1000, 7)
+    }
+    print(f"{'dump_rows_1000':<18}  {results['dump_rows_1000']['rows_per_second']:>10,.0f} rows/s")
+    print(f"\n{sink.messages} recovery emails reached the SMTP sink")
+    return results
+
+
+def print_result(name: str, result: dict[str, float]) -> None:
+    print(
+        f"{name:<18}  {result['rps']:>8.1f} req/s  p50 {result['p50_ms']:>7.1f}ms"
+        f"  p95 {result['p95_ms']:>7.1f}ms  p99 {result['p99_ms']:>7.1f}ms"
+        f"  errors {int(result['errors'])}"
+    )
+
+
+def compare(
+        results: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Return a description of every metric that regressed beyond `tolerance`."""
+    regressions = []
+    for name, result in results.items():
+        if result.get("errors"):
+            regressions.append(f"{name}: {int(result['errors'])} failed requests")
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        # Throughput may only drop, latency may only grow, by the tolerance
+        for metric, higher_is_better in (
+            ("rps", True), ("p95_ms", False), ("rows_per_second", True)
+        ):
+            if metric not in result or metric not in base:
+                continue
+            limit = base[metric] * (1 - tolerance if higher_is_better else 1 + tolerance)
+            if (result[metric] < limit) if higher_is_better else (result[metric] > limit):
+                regressions.append(
+                    f"{name}: {metric} {result[metric]:.1f} vs baseline {base[metric]:.1f}"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100, help="Users to seed")
+    parser.add_argument("--problems", type=int, default=5000, help="Problems to seed")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiplier for every scenario's request count"
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=[scenario.name for scenario in SCENARIOS],
+        default=[scenario.name for scenario in SCENARIOS],
+        help="Scenarios to run"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the server under test")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for choosing users and problems")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Store these results as the new baseline"
+    )
+    parser.add_argument(
+        "--ci",
+        action=argparse.BooleanOptionalAction,
+        default=bool(os.environ.get("CI")),
+        help="Fail when there is no baseline to compare with"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative drop in throughput or rise in p95 latency"
+    )
+    args = parser.parse_args()
+
+    config = {
+        key: getattr(args, key)
+        for key in ("users", "problems", "concurrency", "scale", "workers", "seed")
+    }
+    config["bcrypt_rounds"] = settings.BCRYPT_ROUNDS
+    results = asyncio.run(run(args))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({"config": config, "results": results}, indent=2))
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --save-baseline to record one")
+        if args.ci:
+            print("FAIL: nothing to compare with")
+            sys.exit(1)
+        return
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("config") != config:
+        print(f"Warning: baseline was recorded with {baseline.get('config')}")
+    regressions = compare(results, baseline, args.tolerance)
+    if args.ci:
+        regressions += [
+            f"{name}: not in the baseline"
+            for name in results
+            if name not in baseline.get("results", {})
+        ]
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
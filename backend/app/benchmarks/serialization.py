@@ -0,0 +1,95 @@
+"""
+Measure how fast problem list pages are turned into response bytes.
+
+Run from the backend directory:
+
+    python -m app.benchmarks.serialization --sizes 100 1000 10000
+
+Compares the old path (ORM objects wrapped in `ProblemsPublic`, re-validated
+against the response model and encoded with the standard json module), the
+same path with `ORJSONResponse`, and the current one that writes result rows
+straight to JSON with `dump_rows`. Only serialization is timed, the rows are
+generated up front.
+"""
+import argparse
+import statistics
+import time
+import uuid
+from collections import namedtuple
+from collections.abc import Callable
+from typing import Any
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.api.serialization import dump_rows
+from app.crud import PROBLEM_PUBLIC_COLUMNS
+from app.models import Difficulty, Problem, ProblemsPublic
+
+ProblemRow = namedtuple("ProblemRow", [column.key for column in PROBLEM_PUBLIC_COLUMNS])
+
+
+def make_rows(size: int) -> list[Any]:
+    difficulties = list(Difficulty)
+    return [
+        ProblemRow(
+            id=uuid.uuid4(),
+            number=number,
+            name=f"Problem {number} with a realistic title",
+            description="Given an array of integers, return indices of two numbers "
+                        "such that they add up to a specific target.",
+            difficulty=difficulties[number % len(difficulties)]
+        )
+        for number in range(1, size + 1)
+    ]
+
+
+def model_body(problems: list[Problem], response_class: type[JSONResponse]) -> bytes:
+    # What FastAPI did with `response_model=ProblemsPublic`: the returned model
+    # is dumped, validated again and serialized for the response class
+    page = ProblemsPublic(data=problems, count=len(problems), next_cursor=None)
+    checked = ProblemsPublic.model_validate(page.model_dump(by_alias=True))
+    return response_class(checked.model_dump(mode="json")).body
+
+
+def measure(run: Callable[[], bytes], rows: int, samples: int) -> float:
+    """Return the median rows per second over `samples` timed runs."""
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return rows / statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 10000],
+        help="Page sizes to serialize"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=7, help="Timed runs per page size and path"
+    )
+    args = parser.parse_args()
+
+    print(f"{'rows':>6}  {'model+json':>12}  {'model+orjson':>12}  {'rows+orjson':>12}  {'speedup':>7}")
+    for size in args.sizes:
+        rows = make_rows(size)
+        problems = [Problem(**row._asdict()) for row in rows]
+        before = measure(lambda: model_body(problems, JSONResponse), size, args.samples)
+        orjson_only = measure(lambda: model_body(problems, ORJSONResponse), size, args.samples)
+        after = measure(
+            lambda: dump_rows(rows, count=size, next_cursor=None), size, args.samples
+        )
+        print(
+            f"{size:>6}  {before:>12,.0f}  {orjson_only:>12,.0f}  {after:>12,.0f}"
+            f"  {after / before:>6.1f}x"
+        )
+    print("\nrows/s, median of each run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark bcrypt cost factors on this host and recommend `BCRYPT_ROUNDS`.
+
+Run from the backend directory, ideally on hardware matching production:
+
+    python -m app.calibrate_bcrypt --target-ms 250
+
+Each cost doubles the work, so the recommendation is the highest cost whose
+median verify time stays within the target.
+"""
+import argparse
+import statistics
+import time
+
+from passlib.hash import bcrypt
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 18
+
+
+def measure_verify(rounds: int, samples: int) -> float:
+    """Return the median verify time in seconds for the given cost."""
+    hashed = bcrypt.using(rounds=rounds).hash("calibration-password")
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.verify("calibration-password", hashed)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def calibrate(target_seconds: float, samples: int) -> tuple[int, dict[int, float]]:
+    results: dict[int, float] = {}
+    recommended = MIN_ROUNDS
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        results[rounds] = measure_verify(rounds, samples)
+        if results[rounds] <= target_seconds:
+            recommended = rounds
+        elif results[rounds] > 2 * target_seconds:
+            # Every further cost is at least twice as slow again
+            break
+    return recommended, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=250.0,
+        help="Acceptable median verify latency per login, in milliseconds"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=5, help="Verifications timed per cost"
+    )
+    args = parser.parse_args()
+
+    recommended, results = calibrate(args.target_ms / 1000, args.samples)
+    print(f"{'rounds':>6}  {'verify ms':>10}  {'logins/s/core':>13}")
+    for rounds, seconds in results.items():
+        marker = "  <-" if rounds == recommended else ""
+        print(f"{rounds:>6}  {seconds * 1000:>10.1f}  {1 / seconds:>13.1f}{marker}")
+    print(f"\nBCRYPT_ROUNDS={recommended}")
+
+
+if __name__ == "__main__":
+    main()
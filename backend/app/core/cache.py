@@ -0,0 +1,74 @@
+import threading
+from collections.abc import Hashable
+from typing import Generic, TypeVar
+
+from cachetools import TTLCache
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class TTLLRUCache(Generic[T]):
+    """
+    Thread-safe TTL + LRU cache with hit/miss counters.
+
+    Sync routes run in the threadpool, so every access goes through a lock.
+    Entries are only invalidated in this process; the TTL bounds how long
+    other workers can serve a stale entry.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._cache: TTLCache[Hashable, T] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> T | None:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: T) -> None:
+        if not self._cache.maxsize:
+            return
+        with self._lock:
+            self._cache[key] = value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "maxsize": int(self._cache.maxsize)
+            }
+
+
+# Detached `User` rows keyed by id, used by `get_current_user`
+user_cache: TTLLRUCache = TTLLRUCache(
+    maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.USER_CACHE_TTL_SECONDS
+)
+
+# Serialized problem responses keyed by (catalog version, request key)
+catalog_cache: TTLLRUCache = TTLLRUCache(
+    maxsize=settings.CATALOG_CACHE_MAXSIZE, ttl=settings.CATALOG_CACHE_TTL_SECONDS
+)
+
+# Users who wrote recently, keyed by token subject; their reads skip replicas
+# until the entry expires
+recent_writers: TTLLRUCache = TTLLRUCache(
+    maxsize=10_000, ttl=settings.DB_REPLICA_STICKY_SECONDS
+)
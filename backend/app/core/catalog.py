@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+
+import psycopg
+
+from app import crud
+from app.core.config import settings
+from app.core.db import AsyncDB
+from app.models import Problem
+
+logger = logging.getLogger(__name__)
+
+# A quiet LISTEN connection is checked this often, so a dead one is noticed
+HEARTBEAT_SECONDS = 30.0
+# Delay before reconnecting, doubled up to the cap
+RETRY_SECONDS = 1.0
+MAX_RETRY_SECONDS = 30.0
+
+
+class ProblemCatalog:
+    """
+    In-process copy of problems indexed by id and number, and the catalog version.
+
+    The copy is only used while `listening`. Every catalog write NOTIFYs
+    `crud.CATALOG_CHANNEL` in its transaction, and `listen` applies each
+    notification on commit: the changed problem is patched or dropped, and
+    the version advances. Workers therefore agree within milliseconds. Bulk
+    writes send no row, so they clear the whole copy.
+
+    While the LISTEN connection is down the copy is empty and reads go to
+    the database, so a lost notification cannot leave a worker stale.
+    Problems are loaded on first use and the least recently used are evicted
+    beyond `maxsize`.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._by_id: OrderedDict[uuid.UUID, Problem] = OrderedDict()
+        self._by_number: dict[int, uuid.UUID] = {}
+        self.listening = False
+        self.version: int | None = None
+        # Advanced by every change, a load that raced with one is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.notifications = 0
+        self.connects = 0
+
+    def get(self, id: uuid.UUID) -> Problem | None:
+        with self._lock:
+            problem = self._by_id.get(id)
+            if problem is None:
+                self.misses += 1
+                return None
+            self._by_id.move_to_end(id)
+            self.hits += 1
+            return problem
+
+    def get_by_number(self, number: int) -> Problem | None:
+        with self._lock:
+            id = self._by_number.get(number)
+        return self.get(id) if id is not None else None
+
+    def put(self, problem: Problem, generation: int) -> None:
+        """Store a problem loaded when `generation` was current."""
+        with self._lock:
+            if not self.listening or generation != self.generation:
+                return
+            self._store(problem)
+            while len(self._by_id) > self.maxsize:
+                self._remove(next(iter(self._by_id)))
+
+    def _store(self, problem: Problem) -> None:
+        self._remove(problem.id)
+        self._by_id[problem.id] = problem
+        self._by_number[problem.number] = problem.id
+
+    def _remove(self, id: uuid.UUID) -> None:
+        problem = self._by_id.pop(id, None)
+        if problem is not None and self._by_number.get(problem.number) == id:
+            del self._by_number[problem.number]
+
+    def observe_version(self, version: int) -> None:
+        with self._lock:
+            if self.listening:
+                self.version = max(self.version or 0, version)
+
+    def apply(self, payload: str) -> None:
+        """Apply a notification sent by `crud.bump_catalog_version`."""
+        message = json.loads(payload)
+        change = message["change"] or {"op": "reset"}
+        with self._lock:
+            self.generation += 1
+            self.notifications += 1
+            self.version = max(self.version or 0, message["version"])
+            if change["op"] == "upsert":
+                # Only problems already in the copy are patched, others load lazily
+                problem = Problem.model_validate(change["problem"])
+                if problem.id in self._by_id:
+                    self._store(problem)
+            elif change["op"] == "delete":
+                self._remove(uuid.UUID(change["id"]))
+            else:
+                self._by_id.clear()
+                self._by_number.clear()
+
+    def reset(self, *, listening: bool) -> None:
+        with self._lock:
+            self.generation += 1
+            self.listening = listening
+            self.version = None
+            self._by_id.clear()
+            self._by_number.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "listening": int(self.listening),
+                "version": self.version or 0,
+                "size": len(self._by_id),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "notifications": self.notifications,
+                "connects": self.connects
+            }
+
+    async def _listen_once(self) -> None:
+        conninfo = str(settings.SQLALCHEMY_DATABASE_URI).replace("+psycopg", "", 1)
+        async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+            await conn.execute(f"LISTEN {crud.CATALOG_CHANNEL}")
+            self.connects += 1
+            self.reset(listening=True)
+            logger.info("Listening for catalog changes")
+            try:
+                while True:
+                    async for notify in conn.notifies(timeout=HEARTBEAT_SECONDS):
+                        self.apply(notify.payload)
+                    await conn.execute("SELECT 1")
+            finally:
+                self.reset(listening=False)
+
+    async def listen(self) -> None:
+        """Keep a LISTEN connection to the primary open, reconnecting on failure."""
+        delay = RETRY_SECONDS
+        while True:
+            connects = self.connects
+            try:
+                await self._listen_once()
+            except Exception:
+                logger.warning(
+                    "Catalog LISTEN connection failed, retrying in %.0fs", delay, exc_info=True
+                )
+            if self.connects != connects:
+                delay = RETRY_SECONDS
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_SECONDS)
+
+
+problem_catalog = ProblemCatalog(maxsize=settings.PROBLEM_CACHE_MAXSIZE)
+
+
+def _detached(problem: Problem | None) -> Problem | None:
+    # A copy outside any session, shared by every request that reads it
+    return Problem.model_validate(problem) if problem is not None else None
+
+
+async def get_catalog_version(db: AsyncDB) -> int:
+    """The catalog version, from memory while the catalog is listening."""
+    if not problem_catalog.listening:
+        return await db.read(crud.get_catalog_version)
+    version = problem_catalog.version
+    if version is None:
+        # Notifications come from the primary, so the first read does too
+        version = await db.run(crud.get_catalog_version)
+        problem_catalog.observe_version(version)
+    return max(version, problem_catalog.version or 0)
+
+
+async def get_problem(db: AsyncDB, *, id: uuid.UUID) -> Problem | None:
+    """`crud.get_problem` served from memory while the catalog is listening."""
+    if not problem_catalog.listening or not problem_catalog.maxsize:
+        return await db.read(crud.get_problem, id=id)
+    problem = problem_catalog.get(id)
+    if problem is None:
+        generation = problem_catalog.generation
+        problem = _detached(await db.run(crud.get_problem, id=id))
+        if problem is not None:
+            problem_catalog.put(problem, generation)
+    return problem
+
+
+async def get_problem_by_number(db: AsyncDB, *, number: int) -> Problem | None:
+    """`crud.get_problem_by_number` served from memory while the catalog is listening."""
+    if not problem_catalog.listening or not problem_catalog.maxsize:
+        return await db.read(crud.get_problem_by_number, number=number)
+    problem = problem_catalog.get_by_number(number)
+    if problem is None:
+        generation = problem_catalog.generation
+        problem = _detached(await db.run(crud.get_problem_by_number, number=number))
+        if problem is not None:
+            problem_catalog.put(problem, generation)
+    return problem
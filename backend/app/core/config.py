@@ -3,6 +3,7 @@ from typing import Literal, Self
 
 from pydantic import (
     EmailStr,
+    Field,
     HttpUrl,
     PostgresDsn,
     computed_field,
@@ -24,7 +25,30 @@ class Settings(BaseSettings):
     # 60 minutes * 24 hours * 7 days = 7 days
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7
     FRONTEND_HOST: str = "http://localhost:5173"
+    # In-process cache of authenticated users, set the size to 0 to disable
+    USER_CACHE_MAXSIZE: int = 1024
+    USER_CACHE_TTL_SECONDS: float = 60.0
+    # Serialized and compressed problem responses, keyed by catalog version.
+    # Bodies larger than the limit are sent but not kept; size 0 disables.
+    CATALOG_CACHE_MAXSIZE: int = 256
+    CATALOG_CACHE_TTL_SECONDS: float = 3600.0
+    CATALOG_CACHE_MAX_BODY_BYTES: int = 1024 * 1024
+    # Problems kept in memory by id and number, and the catalog version, kept
+    # coherent across workers by LISTEN/NOTIFY. Listening needs a direct
+    # connection to the primary, not a transaction-pooling PgBouncer.
+    CATALOG_LISTEN_ENABLED: bool = True
+    PROBLEM_CACHE_MAXSIZE: int = 10_000
+    # bcrypt cost factor, see `python -m app.calibrate_bcrypt` for a value that
+    # suits the host. Stored hashes are migrated on successful login.
+    BCRYPT_ROUNDS: int = Field(default=12, ge=4, le=31)
+    # Dedicated bcrypt executor; logins beyond workers + queue get a 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+    PASSWORD_HASH_USE_PROCESSES: bool = False
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
+    # Request timing, query counts and the Prometheus `/metrics` endpoint.
+    # `/metrics` is served outside API_V1_STR and without authentication.
+    METRICS_ENABLED: bool = True
 
     PROJECT_NAME: str
     SENTRY_DSN: HttpUrl | None = None
@@ -33,6 +57,37 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    # Serve async routes from an AsyncEngine; set to False to fall back to the
+    # sync engine run in the threadpool
+    DB_ASYNC: bool = True
+    # Comma separated `host` or `host:port` of streaming replicas serving safe
+    # reads, on POSTGRES_PORT unless given; empty sends everything to the primary
+    POSTGRES_REPLICA_HOSTS: str = ""
+    # A user's reads stay on the primary for this long after they write
+    DB_REPLICA_STICKY_SECONDS: float = 5.0
+    # Replicas are probed this often and skipped while unreachable or lagging
+    DB_REPLICA_CHECK_INTERVAL_SECONDS: float = 5.0
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    # Connection pool, applied to the sync, the async and each replica engine
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Connections opened at startup so the first requests skip the handshake,
+    # in the async pool when DB_ASYNC is set and the sync pool otherwise
+    DB_POOL_WARM_SIZE: int = 2
+    # Checkouts waiting longer than this are logged with the pool state
+    DB_POOL_SLOW_CHECKOUT_SECONDS: float = 1.0
+    # Statements slower than this are logged with their call site, and this
+    # share of slow SELECTs is re-run under EXPLAIN (ANALYZE, BUFFERS) in the
+    # background, at most once per interval
+    DB_SLOW_QUERY_SECONDS: float = 0.5
+    DB_SLOW_QUERY_EXPLAIN_RATE: float = Field(default=0.1, ge=0, le=1)
+    DB_SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS: float = 10.0
+    # Requests over their route's `query_budget` log an error, or raise when
+    # set (tests). Needs METRICS_ENABLED, which counts the queries.
+    DB_QUERY_BUDGET_RAISE: bool = False
 
     @computed_field
     @property
@@ -46,6 +101,24 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_REPLICA_URIS(self) -> list[PostgresDsn]:
+        uris = []
+        for entry in filter(None, map(str.strip, self.POSTGRES_REPLICA_HOSTS.split(","))):
+            host, _, port = entry.rpartition(":")
+            if not host or not port.isdigit():
+                host, port = entry, str(self.POSTGRES_PORT)
+            uris.append(MultiHostUrl.build(
+                scheme="postgresql+psycopg",
+                username=self.POSTGRES_USER,
+                password=self.POSTGRES_PASSWORD,
+                host=host,
+                port=int(port),
+                path=self.POSTGRES_DB,
+            ))
+        return uris
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -62,6 +135,17 @@ class Settings(BaseSettings):
         return self
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
+    # Background mailer: messages are sent in batches over one SMTP connection
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_BATCH_WAIT_SECONDS: float = 0.2
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_RETRY_BACKOFF_SECONDS: float = 2.0
+    SMTP_TIMEOUT_SECONDS: float = 10.0
+    SMTP_IDLE_TIMEOUT_SECONDS: float = 60.0
+    # Persist queued emails in the `emailoutbox` table so restarts lose nothing
+    EMAIL_OUTBOX_ENABLED: bool = False
+    EMAIL_OUTBOX_POLL_SECONDS: float = 5.0
+    EMAIL_OUTBOX_LEASE_SECONDS: float = 300.0
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -1,12 +1,448 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Generator, Sequence
+from contextlib import asynccontextmanager
+from typing import Any, TypeVar
+
+import anyio
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from sqlalchemy import Engine, Row, Select, event, exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
 from sqlmodel import Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app import crud
+from app.core.cache import recent_writers
 from app.core.config import settings
+from app.core.metrics import instrument_queries
 from app.models import User, UserCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PoolMetrics:
+    """Counters fed by pool events and checkout timing for one engine."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def record_checkout(self, checked_out: int) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def record_connect(self) -> None:
+        with self._lock:
+            self.connects += 1
+
+
+class _TimedCheckoutMixin:
+    # SQLAlchemy has no event before a checkout starts waiting, so the wait is
+    # measured around `_do_get`, which blocks until a connection is free
+    metrics: PoolMetrics
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()  # type: ignore[misc]
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.metrics.record_wait(waited, timed_out)
+            if waited >= settings.DB_POOL_SLOW_CHECKOUT_SECONDS:
+                logger.warning(
+                    "Waited %.2fs for a %s connection: %s",
+                    waited, self.metrics.name, pool_stats(self)  # type: ignore[arg-type]
+                )
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_options() -> dict[str, Any]:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _instrument(pool: Pool, name: str) -> None:
+    metrics = PoolMetrics(name)
+    pool.metrics = metrics  # type: ignore[attr-defined]
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(*args: Any) -> None:
+        metrics.record_connect()
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(*args: Any) -> None:
+        metrics.record_checkout(pool.checkedout())  # type: ignore[attr-defined]
+
+
+def pool_stats(pool: Pool) -> dict[str, Any]:
+    metrics: PoolMetrics = pool.metrics  # type: ignore[attr-defined]
+    return {
+        "size": pool.size(),  # type: ignore[attr-defined]
+        "checked_out": pool.checkedout(),  # type: ignore[attr-defined]
+        "checked_in": pool.checkedin(),  # type: ignore[attr-defined]
+        "overflow": pool.overflow(),  # type: ignore[attr-defined]
+        "peak_checked_out": metrics.peak_checked_out,
+        "connects": metrics.connects,
+        "checkouts": metrics.checkouts,
+        "timeouts": metrics.timeouts,
+        "wait_seconds_total": metrics.wait_seconds_total,
+        "wait_seconds_max": metrics.wait_seconds_max,
+    }
+
+
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI), poolclass=TimedQueuePool, **_pool_options()
+)
+_instrument(engine.pool, "sync")
+instrument_queries(engine)
+# psycopg 3 speaks asyncio natively, so both engines share the same URL
+async_engine: AsyncEngine | None = None
+if settings.DB_ASYNC:
+    async_engine = create_async_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=TimedAsyncAdaptedQueuePool,
+        **_pool_options()
+    )
+    _instrument(async_engine.sync_engine.pool, "async")
+    instrument_queries(async_engine.sync_engine)
+
+
+# Probes whether a replica is current, in seconds; a replica that has
+# replayed everything it received counts as current however old its last
+# transaction is. NULL (nothing replayed yet) is treated as too far behind.
+_REPLICA_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    """A read replica with its own pool and health state."""
+
+    def __init__(self, name: str, url: str) -> None:
+        self.name = name
+        # Unhealthy until the first probe succeeds, reads use the primary meanwhile
+        self.healthy = False
+        self.lag_seconds: float | None = None
+        self.failures = 0
+        self.engine: Engine | None = None
+        self.async_engine: AsyncEngine | None = None
+        if settings.DB_ASYNC:
+            self.async_engine = create_async_engine(
+                url, poolclass=TimedAsyncAdaptedQueuePool, **_pool_options()
+            )
+            sync_engine = self.async_engine.sync_engine
+        else:
+            self.engine = create_engine(url, poolclass=TimedQueuePool, **_pool_options())
+            sync_engine = self.engine
+        self.pool = sync_engine.pool
+        _instrument(self.pool, f"replica {name}")
+        instrument_queries(sync_engine)
+
+    def open_session(self) -> Session | AsyncSession:
+        if self.async_engine is not None:
+            return AsyncSession(self.async_engine, expire_on_commit=False)
+        return Session(self.engine)
+
+    def _probe_sync(self) -> float | None:
+        assert self.engine is not None
+        with self.engine.connect() as connection:
+            return connection.execute(_REPLICA_LAG).scalar()
+
+    async def probe(self) -> float | None:
+        """Return the replication lag in seconds."""
+        if self.async_engine is None:
+            return await asyncio.to_thread(self._probe_sync)
+        async with self.async_engine.connect() as connection:
+            return (await connection.execute(_REPLICA_LAG)).scalar()
+
+
+class ReplicaSet:
+    """
+    Round-robin choice among the healthy replicas from `POSTGRES_REPLICA_HOSTS`.
+
+    `monitor` probes every replica each `DB_REPLICA_CHECK_INTERVAL_SECONDS`
+    and takes it out of rotation while it is unreachable or lags by more than
+    `DB_REPLICA_MAX_LAG_SECONDS`. Reads that fail on a replica's connection
+    also take it out until the next successful probe.
+    """
+
+    def __init__(self, urls: list[Any]) -> None:
+        self.replicas = [
+            Replica(f"{url.hosts()[0]['host']}:{url.hosts()[0]['port']}", str(url))
+            for url in urls
+        ]
+        self._next = itertools.count()
+
+    def choose(self) -> Replica | None:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    def _set_health(self, replica: Replica, healthy: bool, reason: str) -> None:
+        if healthy != replica.healthy:
+            if healthy:
+                logger.info("Replica %s is back in rotation", replica.name)
+            else:
+                logger.warning("Replica %s taken out of rotation: %s", replica.name, reason)
+        replica.healthy = healthy
+
+    def mark_failed(self, replica: Replica, error: Exception) -> None:
+        replica.failures += 1
+        self._set_health(replica, False, repr(error))
+
+    async def _check(self, replica: Replica) -> None:
+        try:
+            lag = await asyncio.wait_for(
+                replica.probe(), settings.DB_REPLICA_CHECK_INTERVAL_SECONDS
+            )
+        except Exception as e:
+            replica.lag_seconds = None
+            self.mark_failed(replica, e)
+            return
+        replica.lag_seconds = None if lag is None else float(lag)
+        current = lag is not None and lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+        self._set_health(replica, current, f"replication lag {replica.lag_seconds}s")
+
+    async def check(self) -> None:
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+
+    async def monitor(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL_SECONDS)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            replica.name: {
+                "healthy": int(replica.healthy),
+                "lag_seconds": replica.lag_seconds,
+                "failures": replica.failures
+            }
+            for replica in self.replicas
+        }
+
+
+replicas = ReplicaSet(settings.SQLALCHEMY_REPLICA_URIS)
+
+
+# Committing is what crud writes have in common, reads never commit
+@event.listens_for(Session, "after_commit")
+def _mark_written(session: Session) -> None:
+    session.info["wrote"] = True
+
+
+async def _run(session: Session | AsyncSession, fn: Callable[..., T], kwargs: Any) -> T:
+    if isinstance(session, AsyncSession):
+        return await session.run_sync(lambda sync_session: fn(session=sync_session, **kwargs))
+    return await run_in_threadpool(fn, session=session, **kwargs)
+
+
+def _stream_sync(
+        target: Engine | None, statement: Select[Any]
+) -> Generator[Sequence[Row[Any]], None, None]:
+    assert target is not None
+    with target.connect() as connection:
+        yield from connection.execute(statement).partitions()
+
+
+class AsyncDB:
+    """
+    Runs sync `crud` functions from async code without blocking the loop.
+
+    With an AsyncEngine the function runs through `AsyncSession.run_sync`, so
+    every query awaits on the asyncio driver. On the sync fallback it runs in
+    the threadpool against a regular `Session`. Either way `crud` keeps a
+    single implementation that receives a `session=` keyword.
+
+    `run` always uses the primary. `read` is for functions that only read and
+    tolerate replication lag: it goes to a healthy replica unless this request
+    has written, or `sticky_key` (the token subject) wrote within the last
+    `DB_REPLICA_STICKY_SECONDS`, and falls back to the primary if the replica
+    fails or its pool is exhausted. `recent_writers` lives in this process,
+    so read-your-writes holds only while the token's requests reach the
+    same worker.
+    """
+
+    def __init__(self, session: Session | AsyncSession) -> None:
+        self.session = session
+        self.sticky_key: str | None = None
+        self.wrote = False
+        self._replica: Replica | None = None
+        self._replica_session: Session | AsyncSession | None = None
+
+    async def run(self, fn: Callable[..., T], /, **kwargs: Any) -> T:
+        try:
+            return await _run(self.session, fn, kwargs)
+        finally:
+            sync_session = (
+                self.session.sync_session
+                if isinstance(self.session, AsyncSession) else self.session
+            )
+            if sync_session.info.pop("wrote", False):
+                self.wrote = True
+                if self.sticky_key is not None:
+                    recent_writers.set(self.sticky_key, True)
+
+    def _primary_only(self) -> bool:
+        return self.wrote or (
+            self.sticky_key is not None and bool(recent_writers.get(self.sticky_key))
+        )
+
+    async def read(self, fn: Callable[..., T], /, **kwargs: Any) -> T:
+        if self._primary_only():
+            return await self.run(fn, **kwargs)
+        if self._replica_session is None:
+            replica = replicas.choose()
+            if replica is None:
+                return await self.run(fn, **kwargs)
+            self._replica, self._replica_session = replica, replica.open_session()
+        try:
+            return await _run(self._replica_session, fn, kwargs)
+        except (exc.OperationalError, exc.InterfaceError, exc.TimeoutError) as e:
+            # Errors the server reports, such as recovery conflicts, carry a
+            # SQLSTATE; only connection failures take the replica out of
+            # rotation. A pool timeout means the replica is busy, not down.
+            if (
+                    not isinstance(e, exc.TimeoutError)
+                    and getattr(e.orig, "sqlstate", None) is None
+            ):
+                assert self._replica is not None
+                replicas.mark_failed(self._replica, e)
+            logger.warning("Read failed on replica, retrying on the primary", exc_info=True)
+            await self.close_replica()
+            return await self.run(fn, **kwargs)
+
+    async def stream(
+            self, statement: Select[Any], *, batch_size: int
+    ) -> AsyncIterator[Sequence[Row[Any]]]:
+        """
+        Yield the rows of a read-only `statement` in batches from a server-side
+        cursor, so memory stays flat whatever the size of the result.
+
+        Runs on its own connection, on a replica whenever `read` would use
+        one, because a streaming response body is sent after the request's
+        session has been closed.
+        """
+        replica = None if self._primary_only() else replicas.choose()
+        statement = statement.execution_options(yield_per=batch_size)
+        target = replica.async_engine if replica is not None else async_engine
+        if target is not None:
+            async with target.connect() as connection:
+                result = await connection.stream(statement)
+                async for partition in result.partitions():
+                    yield partition
+            return
+        partitions = _stream_sync(replica.engine if replica is not None else engine, statement)
+        try:
+            async for partition in iterate_in_threadpool(partitions):
+                yield partition
+        finally:
+            # Closes the cursor and connection, shielded so it also runs when
+            # the client went away and the response task is being cancelled
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(partitions.close)
+
+    async def close_replica(self) -> None:
+        session, self._replica_session, self._replica = self._replica_session, None, None
+        if isinstance(session, AsyncSession):
+            await session.close()
+        elif session is not None:
+            await run_in_threadpool(session.close)
+
+
+@asynccontextmanager
+async def open_async_db() -> AsyncIterator[AsyncDB]:
+    if async_engine is None:
+        with Session(engine) as session:
+            db = AsyncDB(session)
+            try:
+                yield db
+            finally:
+                await db.close_replica()
+    else:
+        # Results are serialized after the last commit, outside of any
+        # greenlet, so loaded attributes must not be expired
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            db = AsyncDB(session)
+            try:
+                yield db
+            finally:
+                await db.close_replica()
+
+
+def get_pool_stats() -> dict[str, dict[str, Any]]:
+    stats = {"sync": pool_stats(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = pool_stats(async_engine.sync_engine.pool)
+    for replica in replicas.replicas:
+        stats[f"replica {replica.name}"] = pool_stats(replica.pool)
+    return stats
+
+
+def warm_pool(sync_engine: Engine, size: int) -> None:
+    # Hold all connections at once so the pool really opens `size` of them
+    connections = [sync_engine.connect() for _ in range(size)]
+    for connection in connections:
+        connection.close()
+
+
+async def warm_async_pool(target: AsyncEngine, size: int) -> None:
+    connections = await asyncio.gather(*(target.connect() for _ in range(size)))
+    await asyncio.gather(*(connection.close() for connection in connections))
+
+
+async def warm_pools() -> None:
+    size = min(settings.DB_POOL_WARM_SIZE, settings.DB_POOL_SIZE)
+    if size <= 0:
+        return
+    if async_engine is not None:
+        # Only init_db and the password recovery HTML route use the sync
+        # pool then, they open its connections on demand
+        await warm_async_pool(async_engine, size)
+    else:
+        await asyncio.to_thread(warm_pool, engine, size)
+
 
-def init_db(session: Session) -> None:
+def init_db(session: Session) -> User:
     user = session.exec(
         select(User).where(User.email == settings.FIRST_SUPERUSER)
     ).first()
@@ -16,4 +452,5 @@ def init_db(session: Session) -> None:
             password=settings.FIRST_SUPERUSER_PASSWORD,
             is_superuser=True
         )
-        user = crud.create_user(session=session, user_create=new_user)
\ No newline at end of file
+        user = crud.create_user(session=session, user_create=new_user)
+    return user
@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import smtplib
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
+
+from app import crud
+from app.core.config import settings
+from app.core.db import open_async_db
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutboundEmail:
+    email_to: str
+    subject: str
+    html_content: str
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    attempts: int = 0
+
+
+@dataclass
+class DeliveryError:
+    message: str
+    # 5xx replies will fail the same way again, so they are not retried
+    permanent: bool = False
+
+
+class SMTPSender:
+    """
+    Blocking SMTP client that keeps one connection open between batches.
+
+    Only the mailer uses it, always from its single worker thread. A
+    connection idle for longer than `SMTP_IDLE_TIMEOUT_SECONDS` is checked
+    with NOOP before reuse, and any broken connection is reopened lazily.
+    """
+
+    def __init__(self) -> None:
+        self._smtp: smtplib.SMTP | None = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        assert settings.SMTP_HOST, "no provided configuration for email variables"
+        smtp: smtplib.SMTP
+        if settings.SMTP_TLS:
+            smtp = smtplib.SMTP(
+                settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS
+            )
+            smtp.starttls()
+        elif settings.SMTP_SSL:
+            smtp = smtplib.SMTP_SSL(
+                settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS
+            )
+        else:
+            smtp = smtplib.SMTP(
+                settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS
+            )
+        if settings.SMTP_USER:
+            smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD or "")
+        return smtp
+
+    def _connection(self) -> smtplib.SMTP:
+        idle = time.monotonic() - self._last_used
+        if self._smtp is not None and idle > settings.SMTP_IDLE_TIMEOUT_SECONDS:
+            try:
+                self._smtp.noop()
+            except smtplib.SMTPException:
+                self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+    @staticmethod
+    def _build(email: OutboundEmail) -> EmailMessage:
+        message = EmailMessage()
+        message["Subject"] = email.subject
+        message["From"] = formataddr(
+            (str(settings.EMAILS_FROM_NAME), str(settings.EMAILS_FROM_EMAIL))
+        )
+        message["To"] = email.email_to
+        message.set_content(email.html_content, subtype="html")
+        return message
+
+    def send_batch(self, emails: list[OutboundEmail]) -> list[DeliveryError | None]:
+        results: list[DeliveryError | None] = []
+        for email in emails:
+            try:
+                self._connection().send_message(self._build(email))
+                self._last_used = time.monotonic()
+                results.append(None)
+            except smtplib.SMTPRecipientsRefused as e:
+                permanent = all(code >= 500 for code, _ in e.recipients.values())
+                results.append(DeliveryError(f"Recipient refused: {e.recipients}", permanent))
+            except smtplib.SMTPResponseException as e:
+                permanent = 500 <= e.smtp_code < 600
+                results.append(DeliveryError(f"{e.smtp_code} {e.smtp_error!r}", permanent))
+                if not permanent:
+                    self.close()
+            except (smtplib.SMTPException, OSError) as e:
+                # Connection level problem, reconnect for the next message
+                results.append(DeliveryError(repr(e)))
+                self.close()
+            except Exception as e:
+                # A message that cannot be encoded, e.g. a non-ASCII address
+                # without SMTPUTF8, fails the same way on every attempt. The
+                # connection may be mid-transaction, so it is reopened.
+                results.append(DeliveryError(repr(e), permanent=True))
+                self.close()
+        return results
+
+
+class Mailer:
+    """
+    Background email dispatcher.
+
+    Requests only enqueue; a single task sends queued messages in batches of
+    up to `EMAIL_BATCH_SIZE` over a reused SMTP connection and retries
+    transient failures with exponential backoff. With `EMAIL_OUTBOX_ENABLED`
+    every message is first committed to the `emailoutbox` table and the task
+    drains that table instead of an in-memory queue, so pending mail survives
+    restarts and several workers can share the load.
+    """
+
+    def __init__(self, sender: SMTPSender | None = None) -> None:
+        self.sender = sender or SMTPSender()
+        # One thread owns the SMTP connection, so a send abandoned by a
+        # cancelled task always finishes before `stop` closes the connection
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mailer")
+        self.outbox = settings.EMAIL_OUTBOX_ENABLED
+        self._queue: asyncio.Queue[OutboundEmail] = asyncio.Queue()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self.sent = 0
+        self.failed = 0
+
+    @staticmethod
+    def backoff(attempts: int) -> float:
+        return settings.EMAIL_RETRY_BACKOFF_SECONDS * 2 ** max(0, attempts - 1)
+
+    async def enqueue(self, *, email_to: str, subject: str, html_content: str) -> None:
+        assert settings.emails_enabled, "no provided configuration for email variables"
+        if self.outbox:
+            async with open_async_db() as db:
+                await db.run(
+                    crud.create_outbox_email,
+                    email_to=email_to,
+                    subject=subject,
+                    html_content=html_content
+                )
+            self._wake.set()
+        else:
+            self._queue.put_nowait(
+                OutboundEmail(email_to=email_to, subject=subject, html_content=html_content)
+            )
+
+    def start(self) -> None:
+        if self._task is None:
+            run = self._run_outbox if self.outbox else self._run_queue
+            self._task = asyncio.create_task(run(), name="mailer")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.sender.close)
+
+    async def _send(self, emails: list[OutboundEmail]) -> list[DeliveryError | None]:
+        results = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.sender.send_batch, emails
+        )
+        for email, error in zip(emails, results):
+            if error is None:
+                self.sent += 1
+            else:
+                logger.warning(
+                    "Sending email to %s failed (attempt %d): %s",
+                    email.email_to, email.attempts, error.message
+                )
+        return results
+
+    async def _next_batch(self) -> list[OutboundEmail]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.EMAIL_BATCH_WAIT_SECONDS
+        while len(batch) < settings.EMAIL_BATCH_SIZE:
+            try:
+                batch.append(
+                    await asyncio.wait_for(self._queue.get(), deadline - loop.time())
+                )
+            except TimeoutError:
+                break
+        return batch
+
+    async def _run_queue(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            for email in batch:
+                email.attempts += 1
+            try:
+                results = await self._send(batch)
+            except Exception as e:
+                # Keep the task alive, the batch is retried with backoff below
+                logger.exception("Email queue dispatch failed")
+                results = [DeliveryError(repr(e))] * len(batch)
+            for email, error in zip(batch, results):
+                if error is None:
+                    continue
+                if error.permanent or email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                    self.failed += 1
+                    logger.error("Giving up on email to %s", email.email_to)
+                else:
+                    loop.call_later(
+                        self.backoff(email.attempts), self._queue.put_nowait, email
+                    )
+
+    async def _run_outbox(self) -> None:
+        lease = timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS)
+        while True:
+            # Cleared before claiming so an enqueue during the send is not missed
+            self._wake.clear()
+            try:
+                async with open_async_db() as db:
+                    rows = await db.run(
+                        crud.claim_outbox_emails,
+                        limit=settings.EMAIL_BATCH_SIZE,
+                        max_attempts=settings.EMAIL_MAX_ATTEMPTS,
+                        lease=lease
+                    )
+                batch = [
+                    OutboundEmail(
+                        id=row.id,
+                        email_to=row.email_to,
+                        subject=row.subject,
+                        html_content=row.html_content,
+                        attempts=row.attempts
+                    )
+                    for row in rows
+                ]
+                if batch:
+                    results = await self._send(batch)
+                    failed: dict[uuid.UUID, tuple[str, timedelta | None]] = {}
+                    for email, error in zip(batch, results):
+                        if error is None:
+                            continue
+                        retry_in = None
+                        if not error.permanent and email.attempts < settings.EMAIL_MAX_ATTEMPTS:
+                            retry_in = timedelta(seconds=self.backoff(email.attempts))
+                        else:
+                            self.failed += 1
+                        failed[email.id] = (error.message, retry_in)
+                    async with open_async_db() as db:
+                        await db.run(
+                            crud.complete_outbox_emails,
+                            sent=[email.id for email, error in zip(batch, results) if error is None],
+                            failed=failed
+                        )
+                    if len(batch) == settings.EMAIL_BATCH_SIZE:
+                        # More may be waiting, claim again straight away
+                        continue
+            except Exception:
+                logger.exception("Email outbox dispatch failed")
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(), settings.EMAIL_OUTBOX_POLL_SECONDS
+                )
+                # Give concurrent requests a moment to join the batch
+                await asyncio.sleep(settings.EMAIL_BATCH_WAIT_SECONDS)
+            except TimeoutError:
+                pass
+
+    def stats(self) -> dict[str, int]:
+        return {"queued": self._queue.qsize(), "sent": self.sent, "failed": self.failed}
+
+
+mailer = Mailer()
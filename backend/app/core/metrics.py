@@ -0,0 +1,378 @@
+import bisect
+import logging
+import queue
+import random
+import re
+import threading
+import time
+import traceback
+from collections.abc import Iterable, Sequence
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import URL, Connection, Engine, create_engine, event
+from sqlalchemy.pool import NullPool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, `+Inf` is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+@dataclass
+class QueryStats:
+    queries: int = 0
+    seconds: float = 0.0
+    # The request's scope, the router adds the matched route to it
+    scope: Scope | None = None
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route") if self.scope is not None else None
+        return getattr(route, "path", "unmatched")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised instead of logging when `DB_QUERY_BUDGET_RAISE` is set."""
+
+
+# Queries made on behalf of the current request. Threadpool calls copy the
+# context, so they add to the same object.
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus layout."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: str) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {cumulative}"
+
+
+class RequestMetrics:
+    """
+    Per-route request latency, status and query counters.
+
+    Routes are labelled with their path template, so `/problems/{id}` is one
+    series however many problems exist; requests that match no route share
+    the `unmatched` label.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.queries: dict[tuple[str, str], Histogram] = {}
+        self.db_seconds: dict[tuple[str, str], float] = {}
+        self.responses: dict[tuple[str, str, int], int] = {}
+        # Every query, including those outside requests such as the mailer's
+        self.queries_total = 0
+        self.query_seconds_total = 0.0
+        self.slow_queries_total = 0
+
+    def record_query(self, seconds: float) -> None:
+        with self._lock:
+            self.queries_total += 1
+            self.query_seconds_total += seconds
+            if seconds >= settings.DB_SLOW_QUERY_SECONDS:
+                self.slow_queries_total += 1
+
+    def record_request(
+            self, method: str, route: str, status: int, seconds: float, stats: QueryStats
+    ) -> None:
+        key = (method, route)
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+                self.db_seconds[key] = 0.0
+            self.latency[key].observe(seconds)
+            self.queries[key].observe(stats.queries)
+            self.db_seconds[key] += stats.seconds
+            self.responses[(method, route, status)] = (
+                self.responses.get((method, route, status), 0) + 1
+            )
+
+    def render(self) -> list[str]:
+        with self._lock:
+            lines = [
+                "# TYPE http_request_duration_seconds histogram",
+                *(
+                    line
+                    for (method, route), histogram in self.latency.items()
+                    for line in histogram.samples(
+                        "http_request_duration_seconds", _labels(method=method, route=route)
+                    )
+                ),
+                "# TYPE http_request_db_queries histogram",
+                *(
+                    line
+                    for (method, route), histogram in self.queries.items()
+                    for line in histogram.samples(
+                        "http_request_db_queries", _labels(method=method, route=route)
+                    )
+                ),
+                "# TYPE http_request_db_seconds_total counter",
+                *(
+                    f"http_request_db_seconds_total{{{_labels(method=method, route=route)}}}"
+                    f" {seconds}"
+                    for (method, route), seconds in self.db_seconds.items()
+                ),
+                "# TYPE http_responses_total counter",
+                *(
+                    f"http_responses_total{{{_labels(method=method, route=route, status=status)}}}"
+                    f" {count}"
+                    for (method, route, status), count in self.responses.items()
+                ),
+                "# TYPE db_queries_total counter",
+                f"db_queries_total {self.queries_total}",
+                "# TYPE db_query_seconds_total counter",
+                f"db_query_seconds_total {self.query_seconds_total}",
+                "# TYPE db_slow_queries_total counter",
+                f"db_slow_queries_total {self.slow_queries_total}",
+            ]
+        return lines
+
+
+def _labels(**labels: Any) -> str:
+    def escape(value: Any) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+def render_stats(prefix: str, stats: dict[str, Any], **labels: Any) -> list[str]:
+    """Render a flat stats dict, such as `pool_stats`, as one untyped sample per key."""
+    label_text = f"{{{_labels(**labels)}}}" if labels else ""
+    return [
+        f"{prefix}_{key}{label_text} {float(value)}"
+        for key, value in stats.items()
+        if isinstance(value, int | float)
+    ]
+
+
+request_metrics = RequestMetrics()
+
+
+def current_query_stats() -> QueryStats | None:
+    return _query_stats.get()
+
+
+def _parameters_shape(parameters: Any, executemany: bool) -> str:
+    # Types only, values may be personal data
+    if executemany:
+        rows = list(parameters)
+        return f"{len(rows)} x {_parameters_shape(rows[0], False)}" if rows else "[]"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(
+            f"{key}: {type(value).__name__}" for key, value in parameters.items()
+        ) + "}"
+    if isinstance(parameters, list | tuple):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+_APP_DIR = Path(__file__).resolve().parents[1]
+# Frames of the instrumentation and session plumbing are never the call site
+_PLUMBING = {Path(__file__).resolve(), _APP_DIR / "core" / "db.py"}
+
+
+def _call_site() -> str:
+    for frame in reversed(traceback.extract_stack()):
+        path = Path(frame.filename).resolve()
+        if path.is_relative_to(_APP_DIR) and path not in _PLUMBING:
+            return f"{path.relative_to(_APP_DIR.parent)}:{frame.lineno} {frame.name}"
+    return "unknown"
+
+
+# Only plain reads are re-run, EXPLAIN ANALYZE executes the statement
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+class SlowQueryExplainer:
+    """
+    Re-runs sampled slow reads under EXPLAIN (ANALYZE, BUFFERS) off the request path.
+
+    EXPLAIN ANALYZE executes the statement again, so it runs on a background
+    thread over its own connection, in a read-only transaction that is rolled
+    back. Plans are made one at a time and at most once per
+    `DB_SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS`; slow queries seen meanwhile are
+    logged without a plan.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: queue.Queue[tuple[URL, str, Any]] = queue.Queue(maxsize=1)
+        self._thread: threading.Thread | None = None
+        self._engines: dict[URL, Engine] = {}
+        self._next_at = 0.0
+
+    def submit(self, url: URL, statement: str, parameters: Any) -> bool:
+        """Queue `statement` for a plan, returns False when rate limited or busy."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_at:
+                return False
+            try:
+                self._pending.put_nowait((url, statement, parameters))
+            except queue.Full:
+                return False
+            self._next_at = now + settings.DB_SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._work, name="slow-query-explain", daemon=True
+                )
+                self._thread.start()
+        return True
+
+    def _work(self) -> None:
+        while True:
+            url, statement, parameters = self._pending.get()
+            try:
+                plan = self.explain(url, statement, parameters)
+            except Exception:
+                logger.warning("Could not EXPLAIN slow query", exc_info=True)
+            else:
+                logger.warning("Plan of slow query\n%s\n%s", statement, plan)
+            finally:
+                self._pending.task_done()
+
+    def explain(self, url: URL, statement: str, parameters: Any) -> str:
+        # A sync engine without a pool of its own, also for async engines'
+        # URLs, and not instrumented so its EXPLAINs are never logged as slow
+        if url not in self._engines:
+            self._engines[url] = create_engine(url, poolclass=NullPool)
+        with self._engines[url].connect() as connection:
+            cursor = connection.connection.cursor()
+            try:
+                cursor.execute("SET TRANSACTION READ ONLY")
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                return "\n".join(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.close()
+                connection.rollback()
+
+    def wait(self) -> None:
+        """Block until queued plans are logged."""
+        self._pending.join()
+
+
+slow_query_explainer = SlowQueryExplainer()
+
+
+def _log_slow_query(
+        conn: Connection, statement: str, parameters: Any, executemany: bool, seconds: float
+) -> None:
+    stats = _query_stats.get()
+    explaining = (
+        not executemany
+        and random.random() < settings.DB_SLOW_QUERY_EXPLAIN_RATE
+        and _READ_ONLY.match(statement) is not None
+        and not _WRITES.search(statement)
+        and slow_query_explainer.submit(conn.engine.url, statement, parameters)
+    )
+    logger.warning(
+        "Slow query took %.3fs, route %s, called from %s, parameters %s%s\n%s",
+        seconds,
+        stats.route if stats is not None else "none",
+        _call_site(),
+        _parameters_shape(parameters, executemany),
+        ", plan follows" if explaining else "",
+        statement
+    )
+
+
+def instrument_queries(engine: Engine) -> None:
+    """Count queries and time spent in the database for `engine`, and log slow ones."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(
+            conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, *args: Any
+    ) -> None:
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(
+            conn: Connection,
+            cursor: Any,
+            statement: str,
+            parameters: Any,
+            context: Any,
+            executemany: bool
+    ) -> None:
+        seconds = time.perf_counter() - context._query_started
+        request_metrics.record_query(seconds)
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += seconds
+        if seconds >= settings.DB_SLOW_QUERY_SECONDS:
+            _log_slow_query(conn, statement, parameters, executemany, seconds)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and counts the queries it makes.
+
+    Adds a `Server-Timing` header, e.g. `app;dur=12.1, db;dur=3.4;desc="2 queries"`,
+    so browser dev tools show the database share of a request. The header
+    reflects the time until the response starts; the histograms also include
+    streaming the body.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        stats = QueryStats(scope=scope)
+        token = _query_stats.set(stats)
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                app_ms = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'app;dur={app_ms:.1f}, '
+                    f'db;dur={stats.seconds * 1000:.1f};desc="{stats.queries} queries"'
+                )
+                message["headers"] = [
+                    *message.get("headers", []), (b"server-timing", timing.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _query_stats.reset(token)
+            request_metrics.record_request(
+                scope["method"],
+                stats.route,
+                status,
+                time.perf_counter() - started,
+                stats
+            )
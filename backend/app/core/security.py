@@ -1,12 +1,27 @@
+import asyncio
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
 import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+T = TypeVar("T")
+
+# Pinning min/max to the configured cost makes `needs_update` flag hashes made
+# with any other cost, so they are upgraded or downgraded on the next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
 
 
 ALGORITHM = "HS256"
@@ -23,5 +38,118 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(
+        plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    # Returns a replacement hash when the stored one uses another cost
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+class PasswordHashPoolFull(Exception):
+    """Raised when the password hashing queue is at its configured limit."""
+
+
+def _timed(fn: Callable[..., T], *args: Any) -> tuple[float, T]:
+    # Module level so it can be pickled into a process pool; monotonic is a
+    # system-wide clock on Linux, so the start time is comparable across processes
+    started = time.monotonic()
+    return started, fn(*args)
+
+
+class PasswordHashPool:
+    """
+    Dedicated, size-limited executor for bcrypt hashing and verification.
+
+    Hashing costs hundreds of milliseconds of CPU, so it runs here rather than
+    on the event loop or in the general request threadpool. bcrypt releases the
+    GIL, so threads scale across cores; a process pool can be selected instead.
+    Once `max_queue` calls are waiting for a worker, further calls raise
+    `PasswordHashPoolFull` instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, max_queue: int, use_processes: bool) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so importing the module never forks or spawns threads
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="password-hash"
+                    )
+            return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        executor = self._get_executor()
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHashPoolFull()
+            self._pending += 1
+        submitted = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            started, result = await loop.run_in_executor(executor, _timed, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+        wait = max(0.0, started - submitted)
+        with self._lock:
+            self.completed += 1
+            self.total_wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        return result
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(
+            self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        return await self.run(
+            verify_and_update_password, plain_password, hashed_password
+        )
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self._pending,
+                "queue_depth": max(0, self._pending - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_seconds_total": self.total_wait_seconds,
+                "wait_seconds_max": self.max_wait_seconds
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hash_pool = PasswordHashPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    use_processes=settings.PASSWORD_HASH_USE_PROCESSES
+)
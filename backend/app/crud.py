@@ -1,34 +1,97 @@
-from sqlmodel import Session, select
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any
 
-from app.core.security import get_password_hash, verify_password
-from app.models import User, UserCreate, UserUpdate
+from sqlalchemy import (
+    CTE,
+    JSON,
+    ColumnElement,
+    DateTime,
+    Row,
+    ScalarSelect,
+    Select,
+    Text,
+    Uuid,
+    case,
+    cast,
+    delete,
+    literal,
+    null,
+    or_,
+    text,
+    tuple_,
+    update
+)
+from sqlalchemy.dialects.postgresql import REGCONFIG, insert
+from sqlalchemy.sql.dml import ReturningInsert
+from sqlmodel import Session, func, select
+
+from app.core.cache import user_cache
+from app.core.security import get_password_hash
+from app.models import (
+    CatalogVersion,
+    CountMode,
+    Difficulty,
+    EmailOutbox,
+    Problem,
+    ProblemContent,
+    ProblemContentBase,
+    ProblemCreate,
+    ProblemPublic,
+    ProblemSolved,
+    ProblemSortField,
+    ProblemUpdate,
+    ProblemsBulkPatch,
+    SortOrder,
+    User,
+    UserCreate,
+    UserStats,
+    UserUpdate,
+    problem_search_vector,
+    utc_now
+)
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
-    db_user = User.model_validate(user_create)
+    db_user = User.model_validate(
+        user_create, update={"hashed_password": get_password_hash(user_create.password)}
+    )
     session.add(db_user)
     session.commit()
     session.refresh(db_user)
     return db_user
 
 
-def update_user(*, session: Session, db_user: User, user_update: UserUpdate) -> User:
+def update_user(
+        *,
+        session: Session,
+        user_id: uuid.UUID,
+        user_update: UserUpdate,
+        extra_data: dict[str, Any] | None = None
+) -> User | None:
+    """Apply `user_update` in one `UPDATE ... RETURNING`, returns None for an unknown user."""
     # Get dictionary representation of model instance
-    user_data = user_update.model_dump()
-    extra_data = {}
+    user_data = user_update.model_dump(exclude_unset=True)
     if "password" in user_data:
-        password = user_data["password"]
+        password = user_data.pop("password")
         hashed_password = get_password_hash(password)
-        extra_data["password"] = hashed_password
-    db_user.sqlmodel_update(user_data, update=extra_data)
-    session.add(db_user)
+        user_data["hashed_password"] = hashed_password
+    # Columns set directly, such as a hash made on the password hashing pool
+    user_data.update(extra_data or {})
+    if not user_data:
+        return session.get(User, user_id)
+    statement = update(User).where(User.id == user_id).values(user_data).returning(User)
+    db_user = session.exec(statement).scalar_one_or_none()
     session.commit()
-    session.refresh(db_user)
+    user_cache.invalidate(user_id)
     return db_user
 
 
 def delete_user(*, session: Session, user_delete: User) -> None:
-    pass
+    session.delete(user_delete)
+    session.commit()
+    user_cache.invalidate(user_delete.id)
 
 
 def get_user_by_email(*, session: Session, email: str) -> User | None:
@@ -37,8 +100,675 @@ def get_user_by_email(*, session: Session, email: str) -> User | None:
     return result
 
 
-def authenticate(*, session: Session, email: str, password: str) -> User | None:
-    db_user = get_user_by_email(session=session, email=email)
-    if not db_user or not verify_password(password, db_user.hashed_password):
-        return None
-    return db_user
\ No newline at end of file
+# NOTIFY channel carrying catalog changes, see `app.core.catalog`
+CATALOG_CHANNEL = "catalog"
+
+
+def get_catalog_version(*, session: Session) -> int:
+    version = session.exec(select(CatalogVersion.version)).first()
+    return version or 0
+
+
+def _catalog_bump(
+        change: ColumnElement[Any], *, after: CTE | None = None
+) -> ReturningInsert[Any]:
+    # Part of the writing transaction, so readers never see the new version
+    # before the new data. The row lock serializes catalog writes.
+    if after is None:
+        statement = insert(CatalogVersion).values(id=1, version=1)
+    else:
+        # Embedded in the write that produced `after`, only bumps if it changed rows
+        statement = insert(CatalogVersion).from_select(
+            ["id", "version"], select(literal(1), literal(1)).where(select(after).exists())
+        )
+    statement = statement.on_conflict_do_update(
+        index_elements=[CatalogVersion.id],
+        set_={"version": CatalogVersion.version + 1}
+    )
+    # Listening workers receive the new version and `change` on commit, in
+    # the same round trip as the bump; without a change they drop their copy
+    payload = func.json_build_object("version", CatalogVersion.version, "change", change)
+    return statement.returning(func.pg_notify(CATALOG_CHANNEL, cast(payload, Text)))
+
+
+def bump_catalog_version(
+        *, session: Session, change: dict[str, Any] | None = None
+) -> None:
+    session.exec(_catalog_bump(cast(literal(json.dumps(change)), JSON)))
+
+
+def _upserted(db_problem: Problem) -> dict[str, Any]:
+    return {
+        "op": "upsert",
+        "problem": ProblemPublic.model_validate(db_problem).model_dump(mode="json")
+    }
+
+
+def estimate_count(*, session: Session, statement: Select[Any]) -> int:
+    # The planner row estimate is derived from pg_class.reltuples and column
+    # statistics, so it costs no table scan and honours any WHERE clause
+    compiled = statement.compile(
+        dialect=session.get_bind().dialect,
+        compile_kwargs={"literal_binds": True}
+    )
+    plan = session.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar_one()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def problem_keyset_columns(sort_by: ProblemSortField) -> list[Any]:
+    # `number` is unique, so it is always the last key to make ordering total
+    if sort_by == ProblemSortField.NAME:
+        return [Problem.name, Problem.number]
+    return [Problem.number]
+
+
+# Fields of `ProblemPublic`, in order
+PROBLEM_PUBLIC_COLUMNS = (
+    Problem.id, Problem.number, Problem.name, Problem.description, Problem.difficulty
+)
+
+
+def get_problems(
+        *,
+        session: Session,
+        limit: int,
+        after: list[Any] | None = None,
+        difficulty: Difficulty | None = None,
+        sort_by: ProblemSortField = ProblemSortField.NUMBER,
+        order: SortOrder = SortOrder.ASC
+) -> list[Row[Any]]:
+    # Plain rows rather than `Problem` objects, the list endpoint serializes
+    # them directly and never needs identity-mapped instances
+    columns = problem_keyset_columns(sort_by)
+    statement = select(*PROBLEM_PUBLIC_COLUMNS)
+    if difficulty is not None:
+        statement = statement.where(Problem.difficulty == difficulty)
+    if after is not None:
+        if order == SortOrder.ASC:
+            statement = statement.where(tuple_(*columns) > tuple_(*after))
+        else:
+            statement = statement.where(tuple_(*columns) < tuple_(*after))
+    if order == SortOrder.ASC:
+        statement = statement.order_by(*columns)
+    else:
+        statement = statement.order_by(*(column.desc() for column in columns))
+    return list(session.exec(statement.limit(limit)).all())
+
+
+def count_problems(
+        *, session: Session, mode: CountMode, difficulty: Difficulty | None = None
+) -> int | None:
+    filters = []
+    if difficulty is not None:
+        filters.append(Problem.difficulty == difficulty)
+    if mode == CountMode.EXACT:
+        statement = select(func.count()).select_from(Problem).where(*filters)
+        return session.exec(statement).one()
+    if mode == CountMode.ESTIMATE:
+        return estimate_count(
+            session=session, statement=select(Problem.id).where(*filters)
+        )
+    return None
+
+
+def problems_export_query(*, difficulty: Difficulty | None = None) -> Select[Any]:
+    # Streamed by `AsyncDB.stream` rather than run on a session
+    statement = select(*PROBLEM_PUBLIC_COLUMNS).order_by(Problem.number)
+    if difficulty is not None:
+        statement = statement.where(Problem.difficulty == difficulty)
+    return statement
+
+
+def upsert_problems(*, session: Session, problems: list[ProblemCreate]) -> int:
+    # Rows are keyed by `number`; a batch may not touch the same row twice
+    latest = {problem.number: problem for problem in problems}
+    rows = {
+        number: {"id": uuid.uuid4(), **problem.model_dump(exclude={"content"})}
+        for number, problem in latest.items()
+    }
+    existing = session.exec(
+        select(Problem.id, Problem.number, Problem.difficulty).where(
+            Problem.number.in_(rows)
+        )
+    ).all()
+    regraded = [
+        id for id, number, difficulty in existing
+        if rows[number]["difficulty"] != difficulty
+    ]
+    statement = insert(Problem)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Problem.number],
+        set_={
+            "name": statement.excluded.name,
+            "description": statement.excluded.description,
+            "difficulty": statement.excluded.difficulty
+        }
+    )
+    # A list of parameter sets is sent as multi-row VALUES pages
+    session.exec(statement, params=list(rows.values()))
+    # Rows that carry content replace it whole. Existing problems keep their
+    # id, new ones got the id generated above.
+    ids = {number: row["id"] for number, row in rows.items()}
+    ids.update((number, id) for id, number, _ in existing)
+    contents = [
+        {"problem_id": ids[number], **problem.content.model_dump()}
+        for number, problem in latest.items()
+        if problem.content is not None
+    ]
+    if contents:
+        content_statement = insert(ProblemContent)
+        content_statement = content_statement.on_conflict_do_update(
+            index_elements=[ProblemContent.problem_id],
+            set_={
+                column: content_statement.excluded[column]
+                for column in ProblemContentBase.model_fields
+            }
+        )
+        session.exec(content_statement, params=contents)
+    if regraded:
+        refresh_user_stats(
+            session=session, user_ids=get_solver_ids(session=session, problem_ids=regraded)
+        )
+    bump_catalog_version(session=session)
+    session.commit()
+    return len(rows)
+
+
+def search_problems(
+        *, session: Session, query: str, skip: int = 0, limit: int = 20
+) -> list[tuple[Problem, float]]:
+    # Full-text matches use the GIN tsvector index and trigram matches
+    # (`name % query`) the GIN trigram index; Postgres ORs the two bitmaps
+    ts_query = func.websearch_to_tsquery(cast("english", REGCONFIG), query)
+    rank = (
+        func.ts_rank_cd(problem_search_vector, ts_query)
+        + func.similarity(Problem.name, query)
+    ).label("rank")
+    statement = (
+        select(Problem, rank)
+        .where(
+            or_(
+                problem_search_vector.bool_op("@@")(ts_query),
+                Problem.name.bool_op("%")(query)
+            )
+        )
+        .order_by(rank.desc(), Problem.number)
+        .offset(skip)
+        .limit(limit)
+    )
+    return [(problem, float(score)) for problem, score in session.exec(statement).all()]
+
+
+def get_problem(*, session: Session, id: uuid.UUID) -> Problem | None:
+    return session.get(Problem, id)
+
+
+def get_problem_by_number(*, session: Session, number: int) -> Problem | None:
+    return session.exec(select(Problem).where(Problem.number == number)).first()
+
+
+def get_problem_content(*, session: Session, problem_id: uuid.UUID) -> ProblemContent | None:
+    return session.get(ProblemContent, problem_id)
+
+
+def create_problem(*, session: Session, problem_create: ProblemCreate) -> Problem:
+    db_problem = Problem.model_validate(problem_create)
+    session.add(db_problem)
+    if problem_create.content is not None:
+        session.add(
+            ProblemContent.model_validate(
+                problem_create.content, update={"problem_id": db_problem.id}
+            )
+        )
+    bump_catalog_version(session=session, change=_upserted(db_problem))
+    session.commit()
+    session.refresh(db_problem)
+    return db_problem
+
+
+# The problem before the statement that changes it: subqueries in RETURNING
+# see the snapshot the statement started from, not its own changes
+_before = Problem.__table__.alias("before")
+_DIFFICULTY_BEFORE = (
+    select(_before.c.difficulty).where(_before.c.id == Problem.id).scalar_subquery()
+)
+
+
+def _upserted_row(changed: CTE) -> ScalarSelect[Any]:
+    # `_upserted` of the single row in `changed`; the enum column stores
+    # member names where the API uses values
+    fields: list[Any] = []
+    for name in ProblemPublic.model_fields:
+        column = changed.c[name]
+        if name == "difficulty":
+            column = case(
+                {difficulty.name: difficulty.value for difficulty in Difficulty},
+                value=cast(column, Text)
+            )
+        fields += [name, column]
+    problem = func.json_build_object(*fields)
+    return select(func.json_build_object("op", "upsert", "problem", problem)).scalar_subquery()
+
+
+def _deleted_rows(changed: CTE) -> ScalarSelect[Any]:
+    # A single deleted row is removed from the copies, more reset them
+    return (
+        select(
+            case((
+                func.count() == 1,
+                func.json_build_object("op", "delete", "id", func.min(cast(changed.c.id, Text)))
+            ))
+        )
+        .select_from(changed)
+        .scalar_subquery()
+    )
+
+
+def _recounted_stats(changed: CTE, *, regraded: ColumnElement[bool] | None = None) -> CTE:
+    """
+    Recount the stats of the users who solved a problem in `changed`, as part
+    of the statement that changed it.
+
+    The recount reads the snapshot from before the statement, so problems in
+    `changed` count with their new difficulty, or not at all when `regraded`
+    is None because they were deleted. Otherwise only the solvers of rows
+    matching `regraded` are recounted.
+    """
+    solvers = select(ProblemSolved.user_id).join(
+        changed, changed.c.id == ProblemSolved.problem_id
+    )
+    if regraded is not None:
+        solvers = solvers.where(regraded)
+    solvers_cte = solvers.distinct().cte("solvers")
+    solved = ProblemSolved.__table__.alias("solved")
+    if regraded is None:
+        difficulty = Problem.difficulty
+        counted = changed.c.id.is_(None)
+    else:
+        difficulty = func.coalesce(changed.c.difficulty, Problem.difficulty)
+        counted = solved.c.id.is_not(None)
+    # Solvers left without solves get a row of zeros
+    counts = (
+        select(
+            solvers_cte.c.user_id,
+            *(
+                func.count().filter(counted, difficulty == level)
+                for level in _STATS_COLUMNS
+            ),
+            func.count().filter(counted)
+        )
+        .select_from(solvers_cte)
+        .outerjoin(solved, solved.c.user_id == solvers_cte.c.user_id)
+        .outerjoin(Problem, Problem.id == solved.c.problem_id)
+        .outerjoin(changed, changed.c.id == solved.c.problem_id)
+        .group_by(solvers_cte.c.user_id)
+    )
+    columns = ["user_id", *_STATS_COLUMNS.values(), "total_solved"]
+    statement = insert(UserStats).from_select(columns, counts)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={column: statement.excluded[column] for column in columns[1:]}
+    )
+    return statement.cte("stats")
+
+
+def _upserted_content(changed: CTE, content: ProblemContentBase) -> CTE:
+    # Only the fields that are set change, a missing row is created
+    values = content.model_dump(exclude_unset=True)
+    table = ProblemContent.__table__
+    statement = insert(ProblemContent).from_select(
+        ["problem_id", *values],
+        select(
+            changed.c.id,
+            *(literal(value, table.c[column].type) for column, value in values.items())
+        )
+    )
+    if values:
+        statement = statement.on_conflict_do_update(
+            index_elements=[ProblemContent.problem_id],
+            set_={column: statement.excluded[column] for column in values}
+        )
+    else:
+        statement = statement.on_conflict_do_nothing()
+    return statement.cte("content")
+
+
+def update_problem(
+        *, session: Session, id: uuid.UUID, problem_update: ProblemUpdate
+) -> Problem | None:
+    """
+    Apply `problem_update` in one statement, returns None for an unknown id.
+
+    The content upsert, the stats recount of a difficulty change and the
+    catalog bump are data-modifying CTEs of the `UPDATE ... RETURNING`.
+    """
+    update_dict = problem_update.model_dump(exclude_unset=True, exclude={"content"})
+    # The model's columns only, not the derived `search_vector`
+    fields = list(Problem.model_fields)
+    changed = (
+        update(Problem)
+        .where(Problem.id == id)
+        .values(update_dict)
+        .returning(
+            *(getattr(Problem, field) for field in fields),
+            _DIFFICULTY_BEFORE.label("difficulty_before")
+        )
+    ).cte("changed")
+    statement = select(*(changed.c[field] for field in fields)).add_cte(_catalog_bump(_upserted_row(changed), after=changed).cte("bumped"))
+    if "difficulty" in update_dict:
+        statement = statement.add_cte(
+            _recounted_stats(
+                changed, regraded=changed.c.difficulty != changed.c.difficulty_before
+            )
+        )
+    if problem_update.content is not None:
+        statement = statement.add_cte(_upserted_content(changed, problem_update.content))
+    row = session.exec(statement).first()
+    session.commit()
+    return Problem.model_validate(row) if row is not None else None
+
+
+def update_problems(
+        *, session: Session, ids: list[uuid.UUID], patch: ProblemsBulkPatch
+) -> list[uuid.UUID]:
+    """Apply one patch to many problems in a single statement, returns the updated ids."""
+    values = patch.model_dump(exclude_unset=True)
+    # Every problem has a difficulty, an explicit null leaves it unchanged
+    if "difficulty" in values and values["difficulty"] is None:
+        del values["difficulty"]
+    if not values:
+        return list(session.exec(select(Problem.id).where(Problem.id.in_(ids))).all())
+    changed = (
+        update(Problem)
+        .where(Problem.id.in_(ids))
+        .values(values)
+        .returning(Problem.id, Problem.difficulty, _DIFFICULTY_BEFORE.label("difficulty_before"))
+    ).cte("changed")
+    # Too many rows for one notification, listening workers drop their copy
+    statement = select(changed.c.id).add_cte(
+        _catalog_bump(null(), after=changed).cte("bumped")
+    )
+    if "difficulty" in values:
+        statement = statement.add_cte(
+            _recounted_stats(
+                changed, regraded=changed.c.difficulty != changed.c.difficulty_before
+            )
+        )
+    updated = list(session.exec(statement).all())
+    session.commit()
+    return updated
+
+
+def delete_problem(*, session: Session, id: uuid.UUID) -> bool:
+    """Delete a problem in one `DELETE ... RETURNING`, returns whether it existed."""
+    return bool(delete_problems(session=session, ids=[id]))
+
+
+def delete_problems(*, session: Session, ids: list[uuid.UUID]) -> list[uuid.UUID]:
+    """Delete many problems in a single statement, returns the deleted ids."""
+    # Solves cascade with the problems, their solvers are recounted without them
+    changed = delete(Problem).where(Problem.id.in_(ids)).returning(Problem.id).cte("changed")
+    statement = select(changed.c.id).add_cte(
+        _catalog_bump(_deleted_rows(changed), after=changed).cte("bumped"),
+        _recounted_stats(changed)
+    )
+    deleted = list(session.exec(statement).all())
+    session.commit()
+    return deleted
+
+
+def create_outbox_email(
+        *, session: Session, email_to: str, subject: str, html_content: str
+) -> EmailOutbox:
+    db_email = EmailOutbox(email_to=email_to, subject=subject, html_content=html_content)
+    session.add(db_email)
+    session.commit()
+    return db_email
+
+
+def claim_outbox_emails(
+        *, session: Session, limit: int, max_attempts: int, lease: timedelta
+) -> list[EmailOutbox]:
+    # SKIP LOCKED lets every worker claim a disjoint batch. Pushing
+    # `next_attempt_at` out leases the rows, so a worker that dies mid-send
+    # only delays them instead of losing them.
+    now = utc_now()
+    statement = (
+        select(EmailOutbox)
+        .where(
+            EmailOutbox.sent_at.is_(None),
+            EmailOutbox.failed_at.is_(None),
+            EmailOutbox.attempts < max_attempts,
+            EmailOutbox.next_attempt_at <= now
+        )
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    emails = list(session.exec(statement).all())
+    for db_email in emails:
+        db_email.attempts += 1
+        db_email.next_attempt_at = now + lease
+        session.add(db_email)
+    session.commit()
+    return emails
+
+
+def complete_outbox_emails(
+        *,
+        session: Session,
+        sent: list[uuid.UUID],
+        failed: dict[uuid.UUID, tuple[str, timedelta | None]]
+) -> None:
+    # A failure without a retry delay is permanent and is never claimed again
+    now = utc_now()
+    if sent:
+        for db_email in session.exec(select(EmailOutbox).where(EmailOutbox.id.in_(sent))):
+            db_email.sent_at = now
+            db_email.last_error = None
+            session.add(db_email)
+    for id, (error, retry_in) in failed.items():
+        db_email = session.get(EmailOutbox, id)
+        if not db_email:
+            continue
+        db_email.last_error = error
+        if retry_in is None:
+            db_email.failed_at = now
+        else:
+            db_email.next_attempt_at = now + retry_in
+        session.add(db_email)
+    session.commit()
+
+
+_STATS_COLUMNS = {
+    Difficulty.EASY: "easy_solved",
+    Difficulty.MEDIUM: "medium_solved",
+    Difficulty.HARD: "hard_solved"
+}
+
+
+def refresh_user_stats(*, session: Session, user_ids: list[uuid.UUID]) -> None:
+    # Recount from the solve log. Only used when problems change difficulty
+    # or disappear, which is rare compared to solves.
+    if not user_ids:
+        return
+    session.exec(
+        update(UserStats)
+        .where(UserStats.user_id.in_(user_ids))
+        .values({column: 0 for column in [*_STATS_COLUMNS.values(), "total_solved"]})
+    )
+    counts = (
+        select(
+            ProblemSolved.user_id,
+            *(
+                func.count().filter(Problem.difficulty == difficulty)
+                for difficulty in _STATS_COLUMNS
+            ),
+            func.count()
+        )
+        .join(Problem, Problem.id == ProblemSolved.problem_id)
+        .where(ProblemSolved.user_id.in_(user_ids))
+        .group_by(ProblemSolved.user_id)
+    )
+    columns = ["user_id", *_STATS_COLUMNS.values(), "total_solved"]
+    statement = insert(UserStats).from_select(columns, counts)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={column: statement.excluded[column] for column in columns[1:]}
+    )
+    session.exec(statement)
+
+
+def get_solver_ids(*, session: Session, problem_ids: list[uuid.UUID]) -> list[uuid.UUID]:
+    statement = select(ProblemSolved.user_id).where(
+        ProblemSolved.problem_id.in_(problem_ids)
+    ).distinct()
+    return list(session.exec(statement).all())
+
+
+def _counted_solves(user_id: uuid.UUID, inserted: CTE) -> CTE:
+    # Adds the solves `inserted` returns to the user's counters, by the
+    # difficulty the statement reads, never one the caller may hold stale
+    counts = (
+        select(
+            literal(user_id, Uuid()),
+            *(
+                func.count().filter(Problem.difficulty == difficulty)
+                for difficulty in _STATS_COLUMNS
+            ),
+            func.count()
+        )
+        .select_from(inserted.join(Problem, Problem.id == inserted.c.problem_id))
+        .having(func.count() > 0)
+    )
+    columns = ["user_id", *_STATS_COLUMNS.values(), "total_solved"]
+    stats = insert(UserStats).from_select(columns, counts)
+    stats = stats.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={
+            column: getattr(UserStats, column) + stats.excluded[column]
+            for column in columns[1:]
+        }
+    )
+    return stats.cte("stats")
+
+
+def record_solve(
+        *, session: Session, user_id: uuid.UUID, problem: Problem
+) -> tuple[ProblemSolved, bool]:
+    """Record a solve once per user and problem, returns it and whether it is new."""
+    columns = ProblemSolved.__table__.c
+    inserted = (
+        insert(ProblemSolved)
+        .values(id=uuid.uuid4(), user_id=user_id, problem_id=problem.id, solved_at=utc_now())
+        .on_conflict_do_nothing(index_elements=[ProblemSolved.user_id, ProblemSolved.problem_id])
+        .returning(*columns)
+        .cte("inserted")
+    )
+    recorded = select(*columns).where(
+        ProblemSolved.user_id == user_id, ProblemSolved.problem_id == problem.id
+    )
+    # The new row, or the one already recorded, and the counters in one round trip
+    statement = (
+        select(*inserted.c, literal(True).label("created"))
+        .union_all(
+            recorded.add_columns(literal(False)).where(~select(inserted).exists())
+        )
+        .add_cte(_counted_solves(user_id, inserted))
+    )
+    row = session.exec(statement).first()
+    session.commit()
+    if row is None:
+        # Recorded by a concurrent request after this statement's snapshot
+        row = session.exec(recorded.add_columns(literal(False))).one()
+    return ProblemSolved.model_validate(row), row[-1]
+
+
+def record_solves(
+        *,
+        session: Session,
+        user_id: uuid.UUID,
+        problem_ids: list[uuid.UUID],
+        numbers: list[int]
+) -> list[tuple[uuid.UUID, int, bool]]:
+    """
+    Record many solves in one statement, returns (problem id, number, is new)
+    for every problem that exists. Already recorded solves are left alone, so
+    repeating an upload changes nothing.
+    """
+    if not problem_ids and not numbers:
+        return []
+    resolved = (
+        select(Problem.id, Problem.number)
+        .where(or_(Problem.id.in_(problem_ids), Problem.number.in_(numbers)))
+        .cte("resolved")
+    )
+    inserted = (
+        insert(ProblemSolved)
+        .from_select(
+            ["id", "user_id", "problem_id", "solved_at"],
+            select(
+                func.gen_random_uuid(),
+                literal(user_id, Uuid()),
+                resolved.c.id,
+                literal(utc_now(), DateTime(timezone=True))
+            )
+        )
+        .on_conflict_do_nothing(index_elements=[ProblemSolved.user_id, ProblemSolved.problem_id])
+        .returning(ProblemSolved.problem_id)
+        .cte("inserted")
+    )
+    # Resolve, insert and count in a single round trip; the counter upsert
+    # only sees rows this statement actually inserted
+    statement = (
+        select(resolved.c.id, resolved.c.number, inserted.c.problem_id.is_not(None))
+        .select_from(resolved.outerjoin(inserted, inserted.c.problem_id == resolved.c.id))
+        .order_by(resolved.c.number)
+        .add_cte(_counted_solves(user_id, inserted))
+    )
+    rows = [tuple(row) for row in session.exec(statement).all()]
+    session.commit()
+    return rows
+
+
+def get_solves(
+        *,
+        session: Session,
+        user_id: uuid.UUID,
+        limit: int,
+        before: tuple[datetime, uuid.UUID] | None = None
+) -> list[tuple[ProblemSolved, Problem]]:
+    statement = (
+        select(ProblemSolved, Problem)
+        .join(Problem, Problem.id == ProblemSolved.problem_id)
+        .where(ProblemSolved.user_id == user_id)
+    )
+    if before is not None:
+        statement = statement.where(
+            tuple_(ProblemSolved.solved_at, ProblemSolved.id) < tuple_(*before)
+        )
+    statement = statement.order_by(
+        ProblemSolved.solved_at.desc(), ProblemSolved.id.desc()
+    ).limit(limit)
+    return list(session.exec(statement).all())
+
+
+def solves_export_query(*, user_id: uuid.UUID) -> Select[Any]:
+    # Flat rows, newest first like `get_solves`
+    return (
+        select(
+            ProblemSolved.id,
+            ProblemSolved.solved_at,
+            Problem.id.label("problem_id"),
+            Problem.number,
+            Problem.name,
+            Problem.difficulty
+        )
+        .join(Problem, Problem.id == ProblemSolved.problem_id)
+        .where(ProblemSolved.user_id == user_id)
+        .order_by(ProblemSolved.solved_at.desc(), ProblemSolved.id.desc())
+    )
+
+
+def get_user_stats(*, session: Session, user_id: uuid.UUID) -> UserStats | None:
+    return session.get(UserStats, user_id)
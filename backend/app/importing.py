@@ -0,0 +1,253 @@
+import codecs
+import csv
+import json
+import re
+from collections.abc import AsyncIterable, AsyncIterator
+from typing import Any
+
+JSON_MEDIA_TYPE = "application/json"
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl")
+CSV_MEDIA_TYPE = "text/csv"
+
+# Longest JSON element or CSV record buffered while looking for its end
+MAX_ROW_CHARS = 1_000_000
+
+# Each parsed row is either a record or the reason it could not be parsed
+ParsedRow = tuple[int, dict[str, Any] | str]
+
+
+class ImportFormatError(ValueError):
+    """Raised when an upload cannot be parsed any further."""
+
+
+async def _iter_text(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        async for chunk in chunks:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ImportFormatError("Upload is not valid UTF-8")
+    if text:
+        yield text
+
+
+async def _iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    buffer = ""
+    async for text in _iter_text(chunks):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        if len(buffer) > MAX_ROW_CHARS:
+            raise ImportFormatError(f"Line longer than {MAX_ROW_CHARS} characters")
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+def _as_record(value: Any) -> dict[str, Any] | str:
+    if not isinstance(value, dict):
+        return "Row is not a JSON object"
+    return value
+
+
+async def iter_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[ParsedRow]:
+    row = 0
+    async for line in _iter_lines(chunks):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            yield row, _as_record(json.loads(line))
+        except json.JSONDecodeError as e:
+            yield row, f"Invalid JSON: {e.msg}"
+
+
+# Characters that matter when looking for the end of a JSON element
+_JSON_SYNTAX = re.compile(r'["\\{}\[\],]')
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_SEPARATORS = re.compile(r"[, \t\r\n]*")
+
+
+def _element_end(text: str, pos: int) -> int | None:
+    # Index of the `,` or `]` ending the array element starting at `pos`,
+    # also for an element that is not valid JSON. None if it is cut short.
+    depth = 0
+    in_string = False
+    # Position of the character after a backslash, which is never syntax
+    escaped = -1
+    for match in _JSON_SYNTAX.finditer(text, pos):
+        char = match.group()
+        if match.start() == escaped:
+            continue
+        if in_string:
+            if char == "\\":
+                escaped = match.end()
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]" and depth:
+            depth -= 1
+        elif char in ",]" and not depth:
+            return match.start()
+    return None
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[ParsedRow]:
+    # Decodes one array element at a time, so the body is never held whole.
+    # Elements are read at an offset into the buffer, which drops the
+    # consumed text once per chunk.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = finished = False
+    row = 0
+    async for text in _iter_text(chunks):
+        buffer = buffer[pos:] + text
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if not started:
+                if pos == len(buffer):
+                    break
+                if buffer[pos] != "[":
+                    raise ImportFormatError("Expected a JSON array of problems")
+                started = True
+                pos += 1
+                continue
+            if finished:
+                if pos < len(buffer):
+                    raise ImportFormatError("Unexpected data after the JSON array")
+                break
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if buffer.startswith("]", pos):
+                finished = True
+                pos += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                error = e.msg
+            else:
+                end = _WHITESPACE.match(buffer, end).end()
+                if end == len(buffer):
+                    # The element may go on in the next chunk
+                    break
+                if buffer[end] in ",]":
+                    row += 1
+                    pos = end
+                    yield row, _as_record(value)
+                    continue
+                error = "Expecting ',' delimiter"
+            end = _element_end(buffer, pos)
+            if end is None:
+                # Most likely an element split across chunks, wait for more
+                if len(buffer) - pos > MAX_ROW_CHARS:
+                    raise ImportFormatError(
+                        f"Row {row + 1} is longer than {MAX_ROW_CHARS} characters"
+                    )
+                break
+            # Skip the invalid element and resume at the next one
+            row += 1
+            pos = end
+            yield row, f"Invalid JSON: {error}"
+    if not finished:
+        raise ImportFormatError(f"Invalid or truncated JSON array after row {row}")
+
+
+def _ends_quoted(line: str, quoted: bool) -> bool:
+    # Whether `line` ends inside a quoted field, given whether it starts in
+    # one. Like the csv module, a quote only opens a field at its start and
+    # a doubled quote inside one is a literal quote.
+    if '"' not in line:
+        return quoted
+    at_start = not quoted
+    closed = False
+    for char in line:
+        if quoted:
+            if char == '"':
+                quoted = False
+                closed = True
+            continue
+        if closed and char == '"':
+            quoted = True
+        elif char == '"' and at_start:
+            quoted = True
+        at_start = char == ","
+        closed = False
+    return quoted
+
+
+async def _lines_then_end(chunks: AsyncIterable[bytes]) -> AsyncIterator[str | None]:
+    async for line in _iter_lines(chunks):
+        yield line
+    yield None
+
+
+async def iter_csv(chunks: AsyncIterable[bytes]) -> AsyncIterator[ParsedRow]:
+    header: list[str] | None = None
+    # Lines of the record being read, a quoted field may span lines
+    pending: list[str] = []
+    size = 0
+    quoted = False
+    row = 0
+    async for line in _lines_then_end(chunks):
+        queue = [line]
+        while queue:
+            line = queue.pop(0)
+            if line is not None:
+                quoted = _ends_quoted(line, quoted)
+                pending.append(line)
+                size += len(line) + 1
+                if quoted and size <= MAX_ROW_CHARS:
+                    continue
+            elif not pending:
+                continue
+            if quoted:
+                # The quote never closes: report the line that opened it and
+                # read the lines after it again as new records
+                if header is None:
+                    raise ImportFormatError("Unterminated quoted field in the CSV header")
+                row += 1
+                yield row, "Unterminated quoted field"
+                queue = [*pending[1:], *queue, *([None] if line is None else [])]
+                pending, size, quoted = [], 0, False
+                continue
+            record = "\n".join(pending)
+            pending, size = [], 0
+            try:
+                fields = next(csv.reader([record]), [])
+            except csv.Error as e:
+                if header is None:
+                    raise ImportFormatError(f"Invalid CSV header: {e}")
+                row += 1
+                yield row, f"Invalid CSV: {e}"
+                continue
+            if not any(fields):
+                continue
+            if header is None:
+                header = [field.strip() for field in fields]
+                continue
+            row += 1
+            if len(fields) != len(header):
+                yield row, f"Expected {len(header)} columns, got {len(fields)}"
+                continue
+            # Empty cells fall back to the model defaults
+            yield row, {key: value for key, value in zip(header, fields) if value != ""}
+
+
+def iter_records(
+        chunks: AsyncIterable[bytes], media_type: str
+) -> AsyncIterator[ParsedRow]:
+    if media_type == JSON_MEDIA_TYPE:
+        return iter_json_array(chunks)
+    if media_type in NDJSON_MEDIA_TYPES:
+        return iter_ndjson(chunks)
+    if media_type == CSV_MEDIA_TYPE:
+        return iter_csv(chunks)
+    raise ImportFormatError(f"Unsupported content type: {media_type or 'none'}")
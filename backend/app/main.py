@@ -1,6 +1,44 @@
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from app.api.main import api_router
+from app.api.routes import health, metrics
+from app.api.warmup import readiness, run_warm_up
+from app.core.catalog import problem_catalog
 from app.core.config import settings
-app = FastAPI()
-app.include_router(api_router, prefix=settings.API_V1_STR)
\ No newline at end of file
+from app.core.db import replicas
+from app.core.mailer import mailer
+from app.core.metrics import MetricsMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Warm-up runs in the background so `/ready` can answer 503 meanwhile,
+    # and keeps retrying if the database is not reachable yet
+    tasks = [asyncio.create_task(run_warm_up(app.routes))]
+    if replicas.replicas:
+        tasks.append(asyncio.create_task(replicas.monitor()))
+    if settings.CATALOG_LISTEN_ENABLED:
+        tasks.append(asyncio.create_task(problem_catalog.listen()))
+    if settings.emails_enabled:
+        mailer.start()
+    yield
+    readiness.ready = False
+    for task in tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await mailer.stop()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.include_router(api_router, prefix=settings.API_V1_STR)
+app.include_router(health.router)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
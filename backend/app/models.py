@@ -1,13 +1,21 @@
 import uuid
+from datetime import datetime, timezone
 from enum import Enum
 
 from pydantic import EmailStr
-from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Column, Computed, DateTime, Index, Text, UniqueConstraint
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlmodel import SQLModel, Field
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
 
 
 # Shared properties
 class UserBase(SQLModel):
     email: EmailStr = Field(unique=True, index=True, max_length=255)
+    is_active: bool = True
     is_superuser: bool = False
     first_name: str | None = Field(default=None, max_length=255)
     last_name: str | None = Field(default=None, max_length=255)
@@ -60,35 +68,228 @@ class ProblemBase(SQLModel):
     difficulty: Difficulty = Field(default=Difficulty.MEDIUM, index=True)
 
 
+# Long-form text of a problem, as Markdown. `description` stays the short
+# summary shown in lists.
+class ProblemContentBase(SQLModel):
+    statement: str | None = Field(default=None, max_length=50_000, sa_type=Text)
+    examples: str | None = Field(default=None, max_length=50_000, sa_type=Text)
+    constraints: str | None = Field(default=None, max_length=10_000, sa_type=Text)
+
+
 # Properties to receive on problem creation
 class ProblemCreate(ProblemBase):
-    pass
+    content: ProblemContentBase | None = None
 
 
-# Properties to receive on problem update
+# Properties to receive on problem update, only the content fields that are
+# set are changed
 class ProblemUpdate(ProblemBase):
     name: str | None = Field(default=None, min_length=1, max_length=255)
     description: str | None = Field(default=None, max_length=255)
+    content: ProblemContentBase | None = None
 
 
 # Database model
 class Problem(ProblemBase, table=True):
+    # Composite indexes backing keyset pagination on the list endpoint. The
+    # trailing `number` column is the unique tie-breaker stored in the cursor.
+    __table_args__ = (
+        Index("ix_problem_name_number", "name", "number"),
+        Index("ix_problem_difficulty_number", "difficulty", "number"),
+        Index("ix_problem_difficulty_name_number", "difficulty", "name", "number"),
+        # Typo-tolerant `name % query` matching for /problems/search
+        Index(
+            "ix_problem_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"}
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
 
 
+# Generated full-text document for /problems/search, with the name weighted
+# above the description. It is part of the table but not mapped on `Problem`,
+# so loading problems never drags the tsvector along.
+problem_search_vector = Column(
+    "search_vector",
+    TSVECTOR,
+    Computed(
+        "setweight(to_tsvector('english', name), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        persisted=True
+    )
+)
+Problem.__table__.append_column(problem_search_vector)
+Index("ix_problem_search_vector", problem_search_vector, postgresql_using="gin")
+
+
+# Database model, kept apart from `Problem` so list, search and solve queries
+# and the in-process catalog never load the long text. Only the single
+# problem endpoints read it.
+class ProblemContent(ProblemContentBase, table=True):
+    problem_id: uuid.UUID = Field(
+        foreign_key="problem.id", primary_key=True, ondelete="CASCADE"
+    )
+
+
+# Single row counter bumped in every transaction that changes problems, used
+# to version cached responses and ETags of the catalog
+class CatalogVersion(SQLModel, table=True):
+    id: int = Field(default=1, primary_key=True)
+    version: int = 1
+
+
 # Properties to return via API, id is always required
 class ProblemPublic(ProblemBase):
     id: uuid.UUID
 
 
+# A single problem with its long-form text
+class ProblemDetail(ProblemPublic):
+    content: ProblemContentBase | None = None
+
+
 class ProblemsPublic(SQLModel):
     data: list[ProblemPublic]
+    count: int | None
+    next_cursor: str | None = None
+
+
+class ProblemSearchHit(ProblemPublic):
+    rank: float
+
+
+class ProblemSearchResults(SQLModel):
+    data: list[ProblemSearchHit]
+
+
+class ProblemImportError(SQLModel):
+    row: int
+    detail: str
+
+
+# Outcome of a bulk import, `errors` is truncated for very large uploads
+class ProblemsImported(SQLModel):
+    imported: int
+    failed: int
+    errors: list[ProblemImportError]
+
+
+# Fields a bulk update can set on many problems at once; `number` and `name`
+# identify a single problem, so they are only changed one problem at a time
+class ProblemsBulkPatch(SQLModel):
+    description: str | None = Field(default=None, max_length=255)
+    difficulty: Difficulty | None = None
+
+
+class ProblemsBulkUpdate(SQLModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+    patch: ProblemsBulkPatch
+
+
+class ProblemsBulkDelete(SQLModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+
+
+# Outcome of a bulk update or delete, ids that match no problem are listed
+# in `missing_ids`
+class ProblemsBulkResult(SQLModel):
+    ids: list[uuid.UUID]
     count: int
+    missing_ids: list[uuid.UUID] = []
+
 
+# Columns the problem list can be ordered by
+class ProblemSortField(str, Enum):
+    NUMBER = "number"
+    NAME = "name"
+
+
+class SortOrder(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+# Formats of the streaming export endpoints
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+# How list endpoints compute the total `count`
+class CountMode(str, Enum):
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+    NONE = "none"
+
+
+# Database model, one row per problem a user has solved
+class ProblemSolved(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "problem_id", name="uq_problemsolved_user_id_problem_id"
+        ),
+        # Newest-first listing of a user's solves
+        Index("ix_problemsolved_user_id_solved_at_id", "user_id", "solved_at", "id"),
+    )
 
-class ProblemSolved(ProblemBase, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    owner: User = Relationship(back_populates="users", cascade_delete=True)
+    user_id: uuid.UUID = Field(foreign_key="user.id", ondelete="CASCADE")
+    problem_id: uuid.UUID = Field(foreign_key="problem.id", ondelete="CASCADE", index=True)
+    solved_at: datetime = Field(default_factory=utc_now, sa_type=DateTime(timezone=True))
+
+
+# Properties to receive when recording a solve
+class ProblemSolvedCreate(SQLModel):
+    problem_id: uuid.UUID
+
+
+class ProblemSolvedPublic(SQLModel):
+    id: uuid.UUID
+    solved_at: datetime
+    problem: ProblemPublic
+
+
+class ProblemsSolvedPublic(SQLModel):
+    data: list[ProblemSolvedPublic]
+    next_cursor: str | None = None
+
+
+# Problems can be referenced by id, by number, or both in one upload
+class ProblemsSolvedBatchCreate(SQLModel):
+    problem_ids: list[uuid.UUID] = Field(default_factory=list, max_length=1000)
+    numbers: list[int] = Field(default_factory=list, max_length=1000)
+
+
+class ProblemSolvedBatchEntry(SQLModel):
+    problem_id: uuid.UUID
+    number: int
+    created: bool
+
+
+class ProblemsSolvedBatchResult(SQLModel):
+    data: list[ProblemSolvedBatchEntry]
+    created: int
+    missing_ids: list[uuid.UUID] = []
+    missing_numbers: list[int] = []
+
+
+# Database model, per-user solve counters kept in step with `ProblemSolved`
+class UserStats(SQLModel, table=True):
+    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    easy_solved: int = 0
+    medium_solved: int = 0
+    hard_solved: int = 0
+    total_solved: int = 0
+
+
+class UserStatsPublic(SQLModel):
+    easy_solved: int = 0
+    medium_solved: int = 0
+    hard_solved: int = 0
+    total_solved: int = 0
 
 
 class EmailData(SQLModel):
@@ -96,6 +297,22 @@ class EmailData(SQLModel):
     subject: str
 
 
+# Durable queue of outgoing emails, drained by the background mailer
+class EmailOutbox(SQLModel, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    email_to: str = Field(max_length=255)
+    subject: str
+    html_content: str
+    attempts: int = 0
+    last_error: str | None = None
+    created_at: datetime = Field(default_factory=utc_now, sa_type=DateTime(timezone=True))
+    next_attempt_at: datetime = Field(
+        default_factory=utc_now, index=True, sa_type=DateTime(timezone=True)
+    )
+    sent_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    failed_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+
+
 # Generic message
 class Message(SQLModel):
     message: str
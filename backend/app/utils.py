@@ -1,11 +1,11 @@
 import logging
+from collections.abc import Iterable
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any
 
-import emails
 import jwt
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from jwt.exceptions import InvalidTokenError
 
 from app.core import security
@@ -17,16 +17,47 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+EMAIL_TEMPLATES_DIR = Path(__file__).parent / "email-templates" / "build"
+
+# Templates are compiled once per process and kept by the environment; with
+# auto_reload off a render never touches the filesystem. The bytecode cache
+# lets other workers and restarts skip compilation too.
+email_templates = Environment(
+    loader=FileSystemLoader(EMAIL_TEMPLATES_DIR),
+    # Defaults to a private per-user directory under the system temp dir
+    bytecode_cache=FileSystemBytecodeCache(),
+    auto_reload=False,
+    cache_size=-1
+)
+
+
+def load_email_templates() -> list[str]:
+    """Compile every email template up front, returns the loaded names."""
+    names = email_templates.list_templates(extensions=["html"])
+    for name in names:
+        email_templates.get_template(name)
+    return names
+
+
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-            Path(__file__).parent / "email-templates" / "build" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
+    html_content = email_templates.get_template(template_name).render(context)
     return html_content
 
 
+def render_email_templates(
+        *, template_name: str, contexts: Iterable[dict[str, Any]]
+) -> list[str]:
+    """Render one template for many contexts, looking it up only once."""
+    template = email_templates.get_template(template_name)
+    return [template.render(context) for context in contexts]
+
+
 def send_email(*, email_to: str, subject: str = "", html_content: str = "") -> None:
     assert settings.emails_enabled, "no provided configuration for email variables"
+    # Pulls in premailer, lxml, cssutils and requests, so it is only imported
+    # by the rare caller that sends synchronously
+    import emails
+
     message = emails.Message(
         subject=subject,
         html=html_content,
@@ -92,7 +123,7 @@ def generate_reset_password_email(email_to: str, email: str, token: str) -> Emai
 
 
 def generate_reset_password_token(email: str) -> str:
-    expires_delta = timedelta(hours=settings.PASSWORD_RESET_TOKEN_EXPIRE_HOURS)
+    expires_delta = timedelta(hours=settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS)
     expires = datetime.now(timezone.utc) + expires_delta
     encoded_jwt = jwt.encode(
         payload={"exp": expires, "sub": email},
@@ -0,0 +1,83 @@
+from collections.abc import Generator
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from passlib.hash import bcrypt
+
+from app import crud
+from app.api.deps import get_async_db
+from app.api.routes import login
+from app.core.config import settings
+from app.core.security import PasswordHashPool
+from app.main import app
+from app.models import User
+
+URL = f"{settings.API_V1_STR}/login/access-token"
+ROUNDS = 4 if settings.BCRYPT_ROUNDS != 4 else 5
+
+
+class StubDB:
+    """Stands in for `AsyncDB`, records the crud calls of a request."""
+
+    def __init__(self, user: User) -> None:
+        self.user = user
+        self.calls: list[tuple[Any, dict[str, Any]]] = []
+
+    async def run(self, fn: Any, /, **kwargs: Any) -> Any:
+        self.calls.append((fn, kwargs))
+        if fn is crud.get_user_by_email:
+            return self.user if kwargs["email"] == self.user.email else None
+        return self.user
+
+
+@pytest.fixture
+def stub_db() -> Generator[StubDB, None, None]:
+    user = User(
+        email="user@example.com", hashed_password=bcrypt.using(rounds=ROUNDS).hash("password1")
+    )
+    db = StubDB(user)
+
+    async def get_stub_db() -> StubDB:
+        return db
+
+    app.dependency_overrides[get_async_db] = get_stub_db
+    yield db
+    del app.dependency_overrides[get_async_db]
+
+
+@pytest.fixture
+def client() -> TestClient:
+    # Without the lifespan, so no database is needed
+    return TestClient(app)
+
+
+def test_full_hash_pool_returns_503(
+        stub_db: StubDB, client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pool = PasswordHashPool(workers=1, max_queue=0, use_processes=False)
+    # Every slot is taken by other logins
+    pool._pending = pool.workers + pool.max_queue
+    monkeypatch.setattr(login, "password_hash_pool", pool)
+    response = client.post(URL, data={"username": stub_db.user.email, "password": "password1"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert pool.stats()["rejected"] == 1
+
+
+def test_login_rehashes_another_cost(stub_db: StubDB, client: TestClient) -> None:
+    response = client.post(URL, data={"username": stub_db.user.email, "password": "password1"})
+    assert response.status_code == 200
+    assert response.json()["access_token"]
+    (lookup, _), (update, kwargs) = stub_db.calls
+    assert lookup is crud.get_user_by_email
+    assert update is crud.update_user and kwargs["user_id"] == stub_db.user.id
+    new_hash = kwargs["extra_data"]["hashed_password"]
+    assert bcrypt.from_string(new_hash).rounds == settings.BCRYPT_ROUNDS
+    assert bcrypt.verify("password1", new_hash)
+
+
+def test_wrong_password_is_not_rehashed(stub_db: StubDB, client: TestClient) -> None:
+    response = client.post(URL, data={"username": stub_db.user.email, "password": "password2"})
+    assert response.status_code == 400
+    assert [fn for fn, _ in stub_db.calls] == [crud.get_user_by_email]
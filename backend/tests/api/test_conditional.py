@@ -0,0 +1,155 @@
+import gzip
+from collections.abc import Generator
+
+import pytest
+from fastapi import HTTPException, Request
+
+from app.api.conditional import catalog_response, choose_encoding, etag_matches
+from app.core.cache import catalog_cache
+
+pytestmark = pytest.mark.anyio
+
+BODY = b'{"data": [' + b'{"id": 1}, ' * 100 + b"]}"
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, br", "br"),
+        ("GZIP;q=0.5, br;q=0", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*, br;q=0", "gzip"),
+        ("gzip;q=bogus, br", "br"),
+        ("deflate", None),
+    ],
+)
+def test_choose_encoding(accept_encoding: str, expected: str | None) -> None:
+    assert choose_encoding(accept_encoding) == expected
+
+
+def test_choose_encoding_restricted_codings() -> None:
+    assert choose_encoding("br, gzip", ("gzip",)) == "gzip"
+    assert choose_encoding("br", ("gzip",)) is None
+
+
+@pytest.mark.parametrize(
+    ("if_none_match", "expected"),
+    [
+        (None, False),
+        ("", False),
+        ('"7-abc"', True),
+        ('W/"7-abc"', True),
+        ('"7-abc-gzip"', True),
+        ('"7-abc-br"', True),
+        ('"1-xyz", "7-abc"', True),
+        ("*", True),
+        ('"6-abc"', False),
+        ('"7-abc-deflate"', False),
+        ('"7-ab"', False),
+    ],
+)
+def test_etag_matches(if_none_match: str | None, expected: bool) -> None:
+    assert etag_matches(if_none_match, "7-abc") is expected
+
+
+def _request(**headers: str) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [
+            (name.replace("_", "-").encode(), value.encode())
+            for name, value in headers.items()
+        ],
+    })
+
+
+@pytest.fixture(autouse=True)
+def empty_catalog_cache() -> Generator[None, None, None]:
+    catalog_cache.clear()
+    yield
+    catalog_cache.clear()
+
+
+class Builder:
+    def __init__(self, body: bytes | None = BODY) -> None:
+        self.body = body
+        self.calls = 0
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        if self.body is None:
+            raise HTTPException(status_code=404, detail="Problem not found")
+        return self.body
+
+
+async def test_body_is_built_once_per_version() -> None:
+    build = Builder()
+    first = await catalog_response(_request(), version=1, key="k", build=build)
+    second = await catalog_response(_request(), version=1, key="k", build=build)
+    assert first.status_code == second.status_code == 200
+    assert first.body == second.body == BODY
+    assert first.headers["etag"] == second.headers["etag"]
+    assert build.calls == 1
+    newer = await catalog_response(_request(), version=2, key="k", build=build)
+    assert newer.headers["etag"] != first.headers["etag"]
+    assert build.calls == 2
+
+
+async def test_compressed_variant_has_its_own_etag() -> None:
+    build = Builder()
+    plain = await catalog_response(_request(), version=1, key="k", build=build)
+    zipped = await catalog_response(
+        _request(accept_encoding="gzip"), version=1, key="k", build=build
+    )
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(zipped.body) == BODY
+    assert zipped.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert zipped.headers["vary"] == "Accept-Encoding"
+
+
+async def test_small_body_is_not_compressed() -> None:
+    response = await catalog_response(
+        _request(accept_encoding="gzip"), version=1, key="k", build=Builder(b"{}")
+    )
+    assert response.body == b"{}"
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"].endswith('-gzip"')
+
+
+async def test_not_modified_skips_the_build() -> None:
+    first = await catalog_response(_request(), version=1, key="k", build=Builder())
+    tag = first.headers["etag"]
+    catalog_cache.clear()
+    build = Builder()
+    response = await catalog_response(
+        _request(if_none_match=f'"other", W/{tag}', accept_encoding="br"),
+        version=1,
+        key="k",
+        build=build
+    )
+    assert response.status_code == 304
+    assert build.calls == 0
+    # The tag of the representation this client would get, not the one it sent
+    assert response.headers["etag"] == tag[:-1] + '-br"'
+
+
+async def test_wildcard_requires_an_existing_resource() -> None:
+    with pytest.raises(HTTPException) as exc_info:
+        await catalog_response(
+            _request(if_none_match="*"), version=1, key="k", build=Builder(None)
+        )
+    assert exc_info.value.status_code == 404
+
+    build = Builder()
+    response = await catalog_response(
+        _request(if_none_match="*"), version=1, key="k", build=build
+    )
+    assert response.status_code == 304
+    assert build.calls == 1
+    assert response.headers["etag"] != '"*"'
+    assert response.headers["etag"].startswith('"1-')
@@ -0,0 +1,56 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.pagination import decode_cursor, encode_cursor
+
+
+def _raw_cursor(payload: object) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_round_trip() -> None:
+    cursor = encode_cursor("problems:name:asc", ["Two Sum", 1])
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "problems:name:asc", [str, int]) == ["Two Sum", 1]
+
+
+def test_round_trip_non_ascii() -> None:
+    cursor = encode_cursor("problems:name:desc", ["Zwölf ✓", 12])
+    assert decode_cursor(cursor, "problems:name:desc", [str, int]) == ["Zwölf ✓", 12]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        # Made for a different ordering
+        encode_cursor("problems:number:desc", [1]),
+        # Wrong number of values
+        encode_cursor("problems:number:asc", [1, 2]),
+        encode_cursor("problems:number:asc", []),
+        # Wrong value types
+        encode_cursor("problems:number:asc", ["x"]),
+        encode_cursor("problems:number:asc", [1.5]),
+        encode_cursor("problems:number:asc", [True]),
+        encode_cursor("problems:number:asc", [None]),
+        # Not a cursor at all
+        "not base64!",
+        "",
+        _raw_cursor(["problems:number:asc", [1]]),
+        _raw_cursor({"q": "problems:number:asc", "k": 1}),
+        _raw_cursor({"q": "problems:number:asc"}),
+        base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    ],
+)
+def test_invalid_cursor_is_rejected(cursor: str) -> None:
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, "problems:number:asc", [int])
+    assert exc_info.value.status_code == 400
+
+
+def test_name_sort_requires_a_string() -> None:
+    cursor = encode_cursor("problems:name:asc", [7, 1])
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor, "problems:name:asc", [str, int])
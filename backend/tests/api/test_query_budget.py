@@ -0,0 +1,75 @@
+import logging
+from collections.abc import Generator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.api.deps import query_budget
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, QueryBudgetExceeded, instrument_queries
+
+# Any instrumented engine counts, SQLite needs no server
+engine = create_engine("sqlite://")
+instrument_queries(engine)
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/queries/{count}", dependencies=[query_budget(2)])
+def run_queries(count: int) -> dict[str, int]:
+    with engine.connect() as connection:
+        for _ in range(count):
+            connection.execute(text("SELECT 1"))
+    return {"count": count}
+
+
+@pytest.fixture
+def client() -> Generator[TestClient, None, None]:
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("raise_", [True, False])
+def test_within_budget(
+        client: TestClient,
+        monkeypatch: pytest.MonkeyPatch,
+        caplog: pytest.LogCaptureFixture,
+        raise_: bool
+) -> None:
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET_RAISE", raise_)
+    with caplog.at_level(logging.ERROR, logger="app.api.deps"):
+        response = client.get("/queries/2")
+    assert response.status_code == 200
+    assert 'desc="2 queries"' in response.headers["server-timing"]
+    assert not caplog.records
+
+
+def test_over_budget_raises(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET_RAISE", True)
+    with pytest.raises(
+        QueryBudgetExceeded, match=r"/queries/\{count\} issued 3 queries, its budget is 2"
+    ):
+        client.get("/queries/3")
+
+
+def test_over_budget_logs(
+        client: TestClient, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET_RAISE", False)
+    with caplog.at_level(logging.ERROR, logger="app.api.deps"):
+        response = client.get("/queries/3")
+    assert response.status_code == 200
+    assert [record.getMessage() for record in caplog.records] == [
+        "/queries/{count} issued 3 queries, its budget is 2"
+    ]
+
+
+def test_queries_outside_requests_are_not_budgeted(
+        monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET_RAISE", True)
+    # No request, no budget: a background task may issue any number
+    assert run_queries(5) == {"count": 5}
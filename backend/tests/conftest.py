@@ -0,0 +1,40 @@
+import os
+from collections.abc import Generator
+
+import pytest
+
+# Settings required by `app.core.config`, so tests that need no services run
+# without a `.env`. Values from the environment or `.env` take precedence.
+for name, value in {
+    "PROJECT_NAME": "leetvault",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_USER": "postgres",
+    "FIRST_SUPERUSER": "admin@example.com",
+    "FIRST_SUPERUSER_PASSWORD": "changethis",
+    # A route over its `query_budget` fails the test instead of only logging
+    "DB_QUERY_BUDGET_RAISE": "true",
+}.items():
+    os.environ.setdefault(name, value)
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlmodel import Session, text  # noqa: E402
+
+from app.core.db import engine  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def db() -> Generator[Session, None, None]:
+    """A session on the migrated test database, tests using it skip without one."""
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except OperationalError:
+        pytest.skip("PostgreSQL is not reachable")
+    with Session(engine) as session:
+        yield session
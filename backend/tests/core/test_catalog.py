@@ -0,0 +1,136 @@
+import json
+import uuid
+from typing import Any
+
+import pytest
+
+from app.core import catalog
+from app.core.catalog import ProblemCatalog
+from app.models import Difficulty, Problem
+
+pytestmark = pytest.mark.anyio
+
+
+def _problem(number: int = 1, difficulty: Difficulty = Difficulty.EASY, **kwargs: Any) -> Problem:
+    return Problem(number=number, name=f"Problem {number}", difficulty=difficulty, **kwargs)
+
+
+def _payload(version: int, change: dict[str, Any] | None) -> str:
+    return json.dumps({"version": version, "change": change})
+
+
+def _upsert(problem: Problem) -> dict[str, Any]:
+    return {"op": "upsert", "problem": problem.model_dump(mode="json")}
+
+
+@pytest.fixture
+def problem_catalog() -> ProblemCatalog:
+    problem_catalog = ProblemCatalog(maxsize=2)
+    problem_catalog.reset(listening=True)
+    return problem_catalog
+
+
+def test_put_is_ignored_unless_listening() -> None:
+    problem_catalog = ProblemCatalog(maxsize=2)
+    problem = _problem()
+    problem_catalog.put(problem, problem_catalog.generation)
+    assert problem_catalog.get(problem.id) is None
+
+
+def test_stale_put_after_a_change_is_dropped(problem_catalog: ProblemCatalog) -> None:
+    stale = _problem()
+    generation = problem_catalog.generation
+    # The problem is regraded while the read that returned `stale` is in flight
+    regraded = _problem(id=stale.id, difficulty=Difficulty.HARD)
+    problem_catalog.apply(_payload(2, _upsert(regraded)))
+    problem_catalog.put(stale, generation)
+    assert problem_catalog.get(stale.id) is None
+    assert problem_catalog.get_by_number(stale.number) is None
+    problem_catalog.put(regraded, problem_catalog.generation)
+    assert problem_catalog.get(stale.id) == regraded
+
+
+def test_upsert_patches_a_cached_problem(problem_catalog: ProblemCatalog) -> None:
+    problem = _problem()
+    problem_catalog.put(problem, problem_catalog.generation)
+    renumbered = _problem(number=7, id=problem.id, difficulty=Difficulty.MEDIUM)
+    problem_catalog.apply(_payload(3, _upsert(renumbered)))
+    assert problem_catalog.get(problem.id) == renumbered
+    assert problem_catalog.get_by_number(1) is None
+    assert problem_catalog.get_by_number(7) == renumbered
+    assert problem_catalog.version == 3
+
+
+def test_upsert_of_an_uncached_problem_is_not_stored(problem_catalog: ProblemCatalog) -> None:
+    problem = _problem()
+    problem_catalog.apply(_payload(2, _upsert(problem)))
+    assert problem_catalog.get(problem.id) is None
+
+
+def test_delete_and_reset_invalidate(problem_catalog: ProblemCatalog) -> None:
+    first, second = _problem(1), _problem(2)
+    for problem in (first, second):
+        problem_catalog.put(problem, problem_catalog.generation)
+    problem_catalog.apply(_payload(2, {"op": "delete", "id": str(first.id)}))
+    assert problem_catalog.get(first.id) is None
+    assert problem_catalog.get(second.id) == second
+    # Bulk writes notify without a change
+    problem_catalog.apply(_payload(3, None))
+    assert problem_catalog.get(second.id) is None
+    assert problem_catalog.stats()["size"] == 0
+    assert problem_catalog.version == 3
+
+
+def test_least_recently_used_is_evicted(problem_catalog: ProblemCatalog) -> None:
+    first, second, third = _problem(1), _problem(2), _problem(3)
+    problem_catalog.put(first, problem_catalog.generation)
+    problem_catalog.put(second, problem_catalog.generation)
+    problem_catalog.get(first.id)
+    problem_catalog.put(third, problem_catalog.generation)
+    assert problem_catalog.get(second.id) is None
+    assert problem_catalog.get(first.id) == first
+    assert problem_catalog.get(third.id) == third
+
+
+class NotifyingDB:
+    """Stands in for `AsyncDB`; a notification arrives while a problem loads."""
+
+    def __init__(self, problem_catalog: ProblemCatalog, problem: Problem) -> None:
+        self.problem_catalog = problem_catalog
+        self.problem = problem
+        self.loads = 0
+
+    async def run(self, fn: Any, /, **kwargs: Any) -> Problem:
+        self.loads += 1
+        if self.loads == 1:
+            self.problem_catalog.apply(
+                _payload(2, {"op": "delete", "id": str(self.problem.id)})
+            )
+        return self.problem
+
+
+async def test_get_problem_does_not_cache_a_load_that_raced_a_notification(
+        problem_catalog: ProblemCatalog, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(catalog, "problem_catalog", problem_catalog)
+    problem = _problem()
+    db = NotifyingDB(problem_catalog, problem)
+    assert await catalog.get_problem(db, id=problem.id) == problem  # type: ignore[arg-type]
+    assert problem_catalog.get(problem.id) is None
+    # The next load sees no change meanwhile and is kept
+    assert await catalog.get_problem(db, id=problem.id) == problem  # type: ignore[arg-type]
+    assert await catalog.get_problem(db, id=problem.id) == problem  # type: ignore[arg-type]
+    assert db.loads == 2
+
+
+async def test_unknown_id_is_not_cached(
+        problem_catalog: ProblemCatalog, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(catalog, "problem_catalog", problem_catalog)
+
+    class MissingDB:
+        async def run(self, fn: Any, /, **kwargs: Any) -> None:
+            return None
+
+    assert await catalog.get_problem(MissingDB(), id=uuid.uuid4()) is None  # type: ignore[arg-type]
+    assert problem_catalog.stats()["size"] == 0
@@ -0,0 +1,114 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import anyio
+import pytest
+from sqlalchemy import Engine, create_engine, text
+from sqlalchemy.pool import QueuePool
+from sqlmodel import Session
+
+from app.core import db as db_module
+from app.core.cache import TTLLRUCache
+from app.core.db import AsyncDB, ReplicaSet
+
+pytestmark = pytest.mark.anyio
+
+
+def _engine(path: Path, name: str) -> Engine:
+    # SQLite files stand in for the primary and a replica; each one knows its name
+    engine = create_engine(
+        f"sqlite:///{path / name}.db", poolclass=QueuePool, pool_size=1, max_overflow=0,
+        pool_timeout=0.1
+    )
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE server (name TEXT)"))
+        connection.execute(text("INSERT INTO server VALUES (:name)"), {"name": name})
+    return engine
+
+
+def server(*, session: Session) -> str:
+    return session.execute(text("SELECT name FROM server")).scalar_one()
+
+
+def write(*, session: Session) -> None:
+    session.execute(text("UPDATE server SET name = name"))
+    session.commit()
+
+
+class StubReplica:
+    def __init__(self, name: str, engine: Engine) -> None:
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.failures = 0
+
+    def open_session(self) -> Session:
+        return Session(self.engine)
+
+
+@pytest.fixture
+def primary(tmp_path: Path) -> Generator[Session, None, None]:
+    with Session(_engine(tmp_path, "primary")) as session:
+        yield session
+
+
+@pytest.fixture
+def replica(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> StubReplica:
+    replica = StubReplica("replica", _engine(tmp_path, "replica"))
+    replica_set = ReplicaSet([])
+    replica_set.replicas = [replica]  # type: ignore[list-item]
+    monkeypatch.setattr(db_module, "replicas", replica_set)
+    monkeypatch.setattr(db_module, "recent_writers", TTLLRUCache(maxsize=10, ttl=0.2))
+    return replica
+
+
+async def test_reads_go_to_a_healthy_replica(primary: Session, replica: StubReplica) -> None:
+    db = AsyncDB(primary)
+    assert await db.read(server) == "replica"
+    assert await db.run(server) == "primary"
+    await db.close_replica()
+
+
+async def test_pool_timeout_falls_back_to_the_primary(
+        primary: Session, replica: StubReplica
+) -> None:
+    # The replica's only connection is taken, the next checkout times out
+    with replica.engine.connect():
+        db = AsyncDB(primary)
+        assert await db.read(server) == "primary"
+    # A busy replica stays in rotation
+    assert replica.healthy and replica.failures == 0
+    db = AsyncDB(primary)
+    assert await db.read(server) == "replica"
+    await db.close_replica()
+
+
+async def test_connection_failure_takes_the_replica_out(
+        primary: Session, replica: StubReplica, tmp_path: Path
+) -> None:
+    replica.engine = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    db = AsyncDB(primary)
+    assert await db.read(server) == "primary"
+    assert not replica.healthy and replica.failures == 1
+
+
+async def test_writer_reads_the_primary_until_the_window_ends(
+        primary: Session, replica: StubReplica
+) -> None:
+    db = AsyncDB(primary)
+    db.sticky_key = "user"
+    await db.run(write)
+    assert await db.read(server) == "primary"
+    # A later request by the same user sticks too, another user's does not
+    later = AsyncDB(primary)
+    later.sticky_key = "user"
+    assert await later.read(server) == "primary"
+    other = AsyncDB(primary)
+    other.sticky_key = "other"
+    assert await other.read(server) == "replica"
+    await other.close_replica()
+    await anyio.sleep(0.25)
+    after = AsyncDB(primary)
+    after.sticky_key = "user"
+    assert await after.read(server) == "replica"
+    await after.close_replica()
@@ -0,0 +1,199 @@
+import asyncio
+import socket
+import time
+from collections.abc import Callable, Generator
+from typing import Any
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.core.mailer import Mailer
+from app.models import EmailOutbox
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingHandler:
+    """aiosmtpd handler that stores accepted messages and can reject on demand."""
+
+    def __init__(self) -> None:
+        # Replies for the next DATA commands, accepted once empty
+        self.replies: list[str] = []
+        self.attempts: list[float] = []
+        self.messages: list[Any] = []
+        self.sessions: list[Any] = []
+
+    async def handle_DATA(self, server: Any, session: Any, envelope: Any) -> str:
+        self.attempts.append(time.monotonic())
+        if not any(known is session for known in self.sessions):
+            self.sessions.append(session)
+        if self.replies:
+            return self.replies.pop(0)
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch: pytest.MonkeyPatch) -> Generator[RecordingHandler, None, None]:
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    for name, value in {
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": controller.port,
+        "SMTP_TLS": False,
+        "SMTP_SSL": False,
+        "SMTP_USER": None,
+        "EMAILS_FROM_EMAIL": "noreply@example.com",
+        "EMAIL_BATCH_SIZE": 10,
+        "EMAIL_BATCH_WAIT_SECONDS": 0.05,
+        "EMAIL_RETRY_BACKOFF_SECONDS": 0.2,
+        "EMAIL_MAX_ATTEMPTS": 3,
+        "EMAIL_OUTBOX_POLL_SECONDS": 0.1,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    yield handler
+    controller.stop()
+
+
+async def _wait_for(predicate: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+async def _enqueue(mailer: Mailer, count: int) -> None:
+    for i in range(count):
+        await mailer.enqueue(
+            email_to=f"user{i}@example.com", subject=f"Hello {i}", html_content="<p>Hi</p>"
+        )
+
+
+async def test_batch_is_sent_over_one_connection(
+        smtp_server: RecordingHandler, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "EMAIL_OUTBOX_ENABLED", False)
+    mailer = Mailer()
+    batches: list[int] = []
+    send_batch = mailer.sender.send_batch
+
+    def record_batch(emails: list[Any]) -> list[Any]:
+        batches.append(len(emails))
+        return send_batch(emails)
+
+    monkeypatch.setattr(mailer.sender, "send_batch", record_batch)
+    mailer.start()
+    try:
+        await _enqueue(mailer, 5)
+        await _wait_for(lambda: len(smtp_server.messages) == 5)
+        # A later batch reuses the open connection
+        await _enqueue(mailer, 2)
+        await _wait_for(lambda: len(smtp_server.messages) == 7)
+    finally:
+        await mailer.stop()
+    assert batches == [5, 2]
+    assert len(smtp_server.sessions) == 1
+    assert sorted(m.rcpt_tos[0] for m in smtp_server.messages[:5]) == [
+        f"user{i}@example.com" for i in range(5)
+    ]
+    assert mailer.stats() == {"queued": 0, "sent": 7, "failed": 0}
+
+
+async def test_transient_failure_is_retried_with_backoff(
+        smtp_server: RecordingHandler, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "EMAIL_OUTBOX_ENABLED", False)
+    smtp_server.replies = ["451 4.3.0 Try again later", "451 4.3.0 Try again later"]
+    mailer = Mailer()
+    mailer.start()
+    try:
+        await _enqueue(mailer, 1)
+        await _wait_for(lambda: len(smtp_server.messages) == 1)
+    finally:
+        await mailer.stop()
+    first, second, third = smtp_server.attempts
+    # Backoff doubles: 0.2s after the first attempt, 0.4s after the second
+    assert second - first >= settings.EMAIL_RETRY_BACKOFF_SECONDS
+    assert third - second >= 2 * settings.EMAIL_RETRY_BACKOFF_SECONDS
+    assert mailer.stats() == {"queued": 0, "sent": 1, "failed": 0}
+
+
+async def test_transient_failures_give_up_after_max_attempts(
+        smtp_server: RecordingHandler, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "EMAIL_OUTBOX_ENABLED", False)
+    smtp_server.replies = ["451 4.3.0 Try again later"] * 10
+    mailer = Mailer()
+    mailer.start()
+    try:
+        await _enqueue(mailer, 1)
+        await _wait_for(lambda: mailer.failed == 1)
+    finally:
+        await mailer.stop()
+    assert len(smtp_server.attempts) == settings.EMAIL_MAX_ATTEMPTS
+    assert smtp_server.messages == []
+
+
+async def test_unexpected_error_does_not_stop_the_queue(
+        smtp_server: RecordingHandler, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "EMAIL_OUTBOX_ENABLED", False)
+    mailer = Mailer()
+    send_batch = mailer.sender.send_batch
+    calls = 0
+
+    def flaky_send_batch(emails: list[Any]) -> list[Any]:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("unexpected")
+        return send_batch(emails)
+
+    monkeypatch.setattr(mailer.sender, "send_batch", flaky_send_batch)
+    mailer.start()
+    try:
+        await _enqueue(mailer, 1)
+        await _wait_for(lambda: len(smtp_server.messages) == 1)
+    finally:
+        await mailer.stop()
+    assert calls == 2
+
+
+async def test_permanent_failure_marks_outbox_row_failed(
+        smtp_server: RecordingHandler, monkeypatch: pytest.MonkeyPatch, db: Session
+) -> None:
+    monkeypatch.setattr(settings, "EMAIL_OUTBOX_ENABLED", True)
+    smtp_server.replies = ["550 5.1.1 Mailbox unavailable"]
+    mailer = Mailer()
+    db_email = crud.create_outbox_email(
+        session=db, email_to="gone@example.com", subject="Hello", html_content="<p>Hi</p>"
+    )
+
+    def failed() -> bool:
+        db.expire_all()
+        row = db.get(EmailOutbox, db_email.id)
+        return row is not None and row.failed_at is not None
+
+    mailer.start()
+    try:
+        await _wait_for(failed)
+    finally:
+        await mailer.stop()
+    row = db.get(EmailOutbox, db_email.id)
+    assert row is not None
+    assert row.attempts == 1
+    assert row.sent_at is None
+    assert row.last_error is not None and row.last_error.startswith("550")
+    assert len(smtp_server.attempts) == 1
+    db.delete(row)
+    db.commit()
@@ -0,0 +1,80 @@
+import logging
+import threading
+from typing import Any
+
+import pytest
+from sqlalchemy import URL, Engine, create_engine, text
+from sqlmodel import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.metrics import SlowQueryExplainer, instrument_queries
+
+
+class RecordingExplainer(SlowQueryExplainer):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls: list[tuple[str, str]] = []
+
+    def explain(self, url: URL, statement: str, parameters: Any) -> str:
+        self.calls.append((threading.current_thread().name, statement))
+        return "Result  (actual rows=1 loops=1)"
+
+
+@pytest.fixture
+def explainer(monkeypatch: pytest.MonkeyPatch) -> RecordingExplainer:
+    explainer = RecordingExplainer()
+    monkeypatch.setattr(metrics, "slow_query_explainer", explainer)
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_EXPLAIN_RATE", 1.0)
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", 60.0)
+    return explainer
+
+
+@pytest.fixture
+def engine() -> Engine:
+    engine = create_engine("sqlite://")
+    instrument_queries(engine)
+    return engine
+
+
+def test_slow_read_is_explained_in_the_background(
+        explainer: RecordingExplainer, engine: Engine, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.WARNING, logger="app.core.metrics"):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        explainer.wait()
+    assert explainer.calls == [("slow-query-explain", "SELECT 1")]
+    # The plan can be logged before the slow query line
+    plan, slow = sorted(record.getMessage() for record in caplog.records)
+    assert slow.startswith("Slow query took") and "plan follows" in slow
+    assert plan == "Plan of slow query\nSELECT 1\nResult  (actual rows=1 loops=1)"
+
+
+def test_explains_are_rate_limited(
+        explainer: RecordingExplainer, engine: Engine, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.WARNING, logger="app.core.metrics"):
+        with engine.connect() as connection:
+            for _ in range(3):
+                connection.execute(text("SELECT 1"))
+        explainer.wait()
+    assert len(explainer.calls) == 1
+    assert sum("plan follows" in record.getMessage() for record in caplog.records) == 1
+
+
+def test_writes_are_not_explained(explainer: RecordingExplainer, engine: Engine) -> None:
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE item (id INTEGER)"))
+        connection.execute(text("INSERT INTO item VALUES (1)"))
+        connection.execute(text("UPDATE item SET id = 2"))
+    explainer.wait()
+    assert explainer.calls == []
+
+
+def test_explain_analyze_on_postgres(db: Session) -> None:
+    plan = SlowQueryExplainer().explain(
+        db.get_bind().url, "SELECT %(value)s::int", {"value": 1}
+    )
+    assert "actual time=" in plan
@@ -0,0 +1,58 @@
+import threading
+from collections.abc import Generator
+
+import anyio
+import pytest
+from passlib.hash import bcrypt
+
+from app.core.config import settings
+from app.core.security import PasswordHashPool, PasswordHashPoolFull, verify_password
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def pool() -> Generator[PasswordHashPool, None, None]:
+    pool = PasswordHashPool(workers=1, max_queue=1, use_processes=False)
+    yield pool
+    pool.shutdown()
+
+
+async def test_full_pool_rejects_immediately(pool: PasswordHashPool) -> None:
+    release = threading.Event()
+    started = threading.Event()
+
+    def block() -> None:
+        started.set()
+        release.wait(5)
+
+    def blocked(n: int) -> int:
+        release.wait(5)
+        return n
+
+    async with anyio.create_task_group() as tasks:
+        tasks.start_soon(pool.run, block)
+        tasks.start_soon(pool.run, blocked, 1)
+        await anyio.to_thread.run_sync(started.wait, 5)
+        # One call runs and one waits, which is all the pool admits
+        with pytest.raises(PasswordHashPoolFull):
+            await pool.run(blocked, 2)
+        assert pool.stats()["rejected"] == 1
+        release.set()
+    assert pool.stats()["completed"] == 2
+
+
+async def test_verify_and_update_rehashes_another_cost(pool: PasswordHashPool) -> None:
+    rounds = 4 if settings.BCRYPT_ROUNDS != 4 else 5
+    old_hash = bcrypt.using(rounds=rounds).hash("secret-password")
+    verified, new_hash = await pool.verify_and_update("secret-password", old_hash)
+    assert verified
+    assert new_hash is not None and bcrypt.from_string(new_hash).rounds == settings.BCRYPT_ROUNDS
+    assert verify_password("secret-password", new_hash)
+    # A hash at the configured cost is kept
+    assert await pool.verify_and_update("secret-password", new_hash) == (True, None)
+
+
+async def test_wrong_password_is_not_rehashed(pool: PasswordHashPool) -> None:
+    old_hash = bcrypt.using(rounds=4).hash("secret-password")
+    assert await pool.verify_and_update("wrong-password", old_hash) == (False, None)
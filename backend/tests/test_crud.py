@@ -0,0 +1,174 @@
+import uuid
+from collections.abc import Generator
+from typing import Any
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, delete
+
+from app import crud
+from app.api import deps
+from app.core.cache import TTLLRUCache
+from app.core.db import engine
+from app.models import (
+    Difficulty,
+    Problem,
+    ProblemContentBase,
+    ProblemsBulkPatch,
+    ProblemUpdate,
+    User,
+    UserStats,
+    UserUpdate,
+)
+
+
+@pytest.fixture
+def solver(db: Session) -> Generator[User, None, None]:
+    """A user who solved three problems, one of each difficulty."""
+    user = User(email=f"{uuid.uuid4().hex}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    problems = [
+        Problem(number=900_000 + i, name=f"Problem {i}", difficulty=difficulty)
+        for i, difficulty in enumerate(Difficulty)
+    ]
+    db.add_all(problems)
+    db.commit()
+    for problem in problems:
+        crud.record_solve(session=db, user_id=user.id, problem=problem)
+    yield user
+    db.exec(delete(Problem).where(Problem.number >= 900_000))
+    db.delete(user)
+    db.commit()
+
+
+@pytest.fixture
+def statements() -> Generator[list[str], None, None]:
+    executed: list[str] = []
+
+    def record(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def _problems(db: Session, user: User) -> list[Problem]:
+    db.expire_all()
+    solves = crud.get_solves(session=db, user_id=user.id, limit=10)
+    return sorted((problem for _, problem in solves), key=lambda problem: problem.number)
+
+
+def _stats(db: Session, user: User) -> tuple[int, int, int, int]:
+    db.expire_all()
+    stats = db.get(UserStats, user.id)
+    assert stats is not None
+    return stats.easy_solved, stats.medium_solved, stats.hard_solved, stats.total_solved
+
+
+def test_update_problem_is_one_statement(
+        db: Session, solver: User, statements: list[str]
+) -> None:
+    easy = _problems(db, solver)[0]
+    version = crud.get_catalog_version(session=db)
+    statements.clear()
+    problem = crud.update_problem(
+        session=db,
+        id=easy.id,
+        problem_update=ProblemUpdate(
+            number=easy.number,
+            difficulty=Difficulty.HARD,
+            content=ProblemContentBase(statement="Statement")
+        )
+    )
+    assert len(statements) == 1
+    assert problem is not None and problem.difficulty == Difficulty.HARD
+    assert _stats(db, solver) == (0, 1, 2, 3)
+    content = crud.get_problem_content(session=db, problem_id=easy.id)
+    assert content is not None and content.statement == "Statement"
+    assert crud.get_catalog_version(session=db) == version + 1
+
+
+def test_update_unknown_problem_does_not_bump(db: Session, solver: User) -> None:
+    version = crud.get_catalog_version(session=db)
+    problem_update = ProblemUpdate(number=900_100)
+    assert crud.update_problem(session=db, id=uuid.uuid4(), problem_update=problem_update) is None
+    assert crud.get_catalog_version(session=db) == version
+
+
+def test_update_problems_recounts_regraded_solvers(
+        db: Session, solver: User, statements: list[str]
+) -> None:
+    ids = [problem.id for problem in _problems(db, solver)]
+    statements.clear()
+    updated = crud.update_problems(
+        session=db, ids=[*ids, uuid.uuid4()], patch=ProblemsBulkPatch(difficulty=Difficulty.EASY)
+    )
+    assert len(statements) == 1
+    assert sorted(updated) == sorted(ids)
+    assert _stats(db, solver) == (3, 0, 0, 3)
+
+
+def test_delete_problems_recounts_solvers(
+        db: Session, solver: User, statements: list[str]
+) -> None:
+    easy, medium, hard = (problem.id for problem in _problems(db, solver))
+    statements.clear()
+    assert sorted(crud.delete_problems(session=db, ids=[easy, hard])) == sorted([easy, hard])
+    assert len(statements) == 1
+    assert _stats(db, solver) == (0, 1, 0, 1)
+    assert crud.delete_problem(session=db, id=medium)
+    assert _stats(db, solver) == (0, 0, 0, 0)
+    assert not crud.delete_problem(session=db, id=medium)
+
+
+def test_record_solve_counts_the_stored_difficulty(
+        db: Session, solver: User, statements: list[str]
+) -> None:
+    problem = Problem(number=900_010, name="Regraded", difficulty=Difficulty.HARD)
+    db.add(problem)
+    db.commit()
+    # A copy read before the problem was regraded, as from the catalog cache
+    stale = Problem(
+        id=problem.id, number=problem.number, name=problem.name, difficulty=Difficulty.EASY
+    )
+    user_id = solver.id
+    statements.clear()
+    solve, created = crud.record_solve(session=db, user_id=user_id, problem=stale)
+    assert len(statements) == 1
+    assert created and solve.problem_id == problem.id
+    assert _stats(db, solver) == (1, 1, 2, 4)
+    again, created = crud.record_solve(session=db, user_id=user_id, problem=stale)
+    assert not created and again.id == solve.id and again.solved_at == solve.solved_at
+    assert _stats(db, solver) == (1, 1, 2, 4)
+
+
+@pytest.fixture
+def user_cache(monkeypatch: pytest.MonkeyPatch) -> TTLLRUCache:
+    user_cache = TTLLRUCache(maxsize=10, ttl=60)
+    monkeypatch.setattr(crud, "user_cache", user_cache)
+    monkeypatch.setattr(deps, "user_cache", user_cache)
+    return user_cache
+
+
+def _current_user(user_id: uuid.UUID) -> User | None:
+    with Session(engine) as session:
+        return deps._get_user(session=session, user_id=str(user_id))
+
+
+def test_writing_a_user_drops_the_cached_user(db: Session, user_cache: TTLLRUCache) -> None:
+    user = User(email=f"{uuid.uuid4().hex}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    cached = _current_user(user_id)
+    assert cached is not None and cached.is_active
+    assert user_cache.get(user_id) is not None
+    crud.update_user(session=db, user_id=user_id, user_update=UserUpdate(is_active=False))
+    assert user_cache.get(user_id) is None
+    current = _current_user(user_id)
+    assert current is not None and not current.is_active
+    crud.delete_user(session=db, user_delete=user)
+    assert user_cache.get(user_id) is None
+    assert _current_user(user_id) is None
@@ -0,0 +1,158 @@
+import json
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+
+from app import importing
+from app.importing import ImportFormatError, iter_records
+
+pytestmark = pytest.mark.anyio
+
+
+async def _chunks(data: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def _parse(media_type: str, data: str | bytes, size: int = 7) -> list[Any]:
+    if isinstance(data, str):
+        data = data.encode()
+    return [row async for row in iter_records(_chunks(data, size), media_type)]
+
+
+# Small chunks split elements, lines and multi-byte characters across reads
+CHUNK_SIZES = [1, 7, 1 << 16]
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+async def test_json_array(size: int) -> None:
+    data = json.dumps([
+        {"number": 1, "name": "Two Sum", "description": "a, b ] \" \\ é"},
+        {"number": 2, "name": "Add Two Numbers", "content": {"statement": "[{,}]"}},
+    ])
+    assert await _parse("application/json", data, size) == [
+        (1, {"number": 1, "name": "Two Sum", "description": "a, b ] \" \\ é"}),
+        (2, {"number": 2, "name": "Add Two Numbers", "content": {"statement": "[{,}]"}}),
+    ]
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+async def test_json_array_skips_invalid_elements(size: int) -> None:
+    data = '[{"number": 1}, bogus, {"number": 2}, 12abc, [1, {"a": 2}], "x\\"]", {"number": 3}]'
+    rows = await _parse("application/json", data, size)
+    assert rows == [
+        (1, {"number": 1}),
+        (2, "Invalid JSON: Expecting value"),
+        (3, {"number": 2}),
+        (4, "Invalid JSON: Expecting ',' delimiter"),
+        (5, "Row is not a JSON object"),
+        (6, "Row is not a JSON object"),
+        (7, {"number": 3}),
+    ]
+
+
+async def test_json_array_in_one_large_chunk() -> None:
+    # Elements are read at an offset, re-slicing the buffer per element made
+    # a multi-megabyte chunk take tens of seconds
+    rows = [{"number": i, "name": f"Problem {i}", "description": "x" * 80} for i in range(50_000)]
+    data = json.dumps(rows).encode()
+    started = time.perf_counter()
+    parsed = await _parse("application/json", data, len(data))
+    assert time.perf_counter() - started < 5
+    assert parsed == list(enumerate(rows, start=1))
+
+
+@pytest.mark.parametrize(
+    ("data", "message"),
+    [
+        ('{"number": 1}', "Expected a JSON array"),
+        ('[{"number": 1}, {"number":', "truncated JSON array after row 1"),
+        ('[{"number": 1}] trailing', "Unexpected data after the JSON array"),
+    ],
+)
+async def test_json_array_format_errors(data: str, message: str) -> None:
+    with pytest.raises(ImportFormatError, match=message):
+        await _parse("application/json", data)
+
+
+async def test_json_array_element_size_is_capped(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(importing, "MAX_ROW_CHARS", 100)
+    data = '[{"number": 1}, {"name": "' + "x" * 200
+    with pytest.raises(ImportFormatError, match="Row 2 is longer than 100 characters"):
+        await _parse("application/json", data)
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+async def test_ndjson(size: int) -> None:
+    data = '{"number": 1}\r\n\n[1]\nnot json\n{"number": 2}'
+    assert await _parse("application/x-ndjson", data, size) == [
+        (1, {"number": 1}),
+        (2, "Row is not a JSON object"),
+        (3, "Invalid JSON: Expecting value"),
+        (4, {"number": 2}),
+    ]
+
+
+async def test_ndjson_line_length_is_capped(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(importing, "MAX_ROW_CHARS", 100)
+    with pytest.raises(ImportFormatError, match="Line longer than 100 characters"):
+        await _parse("application/x-ndjson", '{"number": 1}\n' + "x" * 200)
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+async def test_csv(size: int) -> None:
+    data = (
+        "﻿number, name ,description\r\n"
+        "1,Two Sum,\r\n"
+        '2,"Add, Two","multi\nline ""quoted"""\n'
+        "\n"
+        "3,5 \"inch,x\n"
+        "4,too,many,columns\n"
+        "5,Last,"
+    )
+    assert await _parse("text/csv", data, size) == [
+        (1, {"number": "1", "name": "Two Sum"}),
+        (2, {"number": "2", "name": "Add, Two", "description": 'multi\nline "quoted"'}),
+        (3, {"number": "3", "name": '5 "inch', "description": "x"}),
+        (4, "Expected 3 columns, got 4"),
+        (5, {"number": "5", "name": "Last"}),
+    ]
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+async def test_csv_unterminated_quote_at_end(size: int) -> None:
+    data = 'number,name\n1,"never closed\n2,b\n3,c'
+    assert await _parse("text/csv", data, size) == [
+        (1, "Unterminated quoted field"),
+        (2, {"number": "2", "name": "b"}),
+        (3, {"number": "3", "name": "c"}),
+    ]
+
+
+async def test_csv_record_size_is_capped(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(importing, "MAX_ROW_CHARS", 40)
+    lines = "\n".join(f"{number},n{number}" for number in range(2, 12))
+    rows = await _parse("text/csv", f'number,name\n1,"never closed\n{lines}\n')
+    # The open quote is reported once the record outgrows the cap, and the
+    # lines it had swallowed are read again
+    assert rows == [
+        (1, "Unterminated quoted field"),
+        *((row, {"number": str(row), "name": f"n{row}"}) for row in range(2, 12)),
+    ]
+
+
+async def test_csv_unterminated_header() -> None:
+    with pytest.raises(ImportFormatError, match="header"):
+        await _parse("text/csv", 'number,"name\n1,a')
+
+
+async def test_invalid_utf8() -> None:
+    with pytest.raises(ImportFormatError, match="not valid UTF-8"):
+        await _parse("application/x-ndjson", b'{"number": 1}\n\xff\n')
+
+
+async def test_unsupported_media_type() -> None:
+    with pytest.raises(ImportFormatError, match="Unsupported content type: text/plain"):
+        await _parse("text/plain", "")